@@ -0,0 +1,121 @@
+""" Benchmarks the throughput of SiloRider's feed parsing on synthetic
+    feeds, for each stage of the process: parsing the HTML and its
+    microformats, matching entries with their HTML elements, interpreting
+    entries, and formatting them for posting.
+
+    Run it from the repository root:
+
+        python benchmarks/bench_parse.py --sizes 100 1000 --photos 2
+"""
+import os.path
+import argparse
+import tempfile
+import configparser
+import benchutil
+import feedgen
+import silorider.format
+from silorider.format import format_entry
+from silorider.parse import (
+    parse_url, parse_mf2_html, EntryMatcher, Entry, Feed,
+    InvalidEntryException)
+
+
+default_feed_sizes = [10, 100, 1000]
+feed_name = 'bench'
+
+
+def make_config(mode, class_rules):
+    config = configparser.ConfigParser(interpolation=None)
+    config.add_section('parse')
+    config.set('parse', 'mode', mode)
+    if class_rules:
+        sec_name = 'classes:%s' % feed_name
+        config.add_section(sec_name)
+        for selector, to_add in feedgen.CLASS_RULES.items():
+            config.set(sec_name, selector, to_add)
+    return config
+
+
+def bench_feed(results, repeat, size, config, feed_path, html):
+    def _add(stage, timings):
+        results.add('%s:%d' % (stage, size), timings,
+                    entries_per_sec=size / min(timings))
+
+    # The whole thing.
+    _add('parse_url', benchutil.time_func(
+        lambda: parse_url(feed_path, feed_name, config), repeat))
+
+    # Each stage separately. Every stage but the first one re-uses the
+    # output of the previous one.
+    _add('parse_mf2_html', benchutil.time_func(
+        lambda: parse_mf2_html(html, feed_name, config), repeat))
+
+    mf_obj = parse_mf2_html(html, feed_name, config)
+    mf_dict = mf_obj.to_dict()
+    _add('EntryMatcher', benchutil.time_func(
+        lambda: EntryMatcher(mf_dict, mf_obj.__doc__), repeat))
+
+    matcher = EntryMatcher(mf_dict, mf_obj.__doc__)
+    feed = Feed(feed_path, matcher.mf_dict)
+
+    def _interpret_all():
+        entries = []
+        for mf_entry, bs_el in matcher.entries:
+            entry = Entry(feed, mf_entry, bs_el)
+            try:
+                entry.interpret()
+            except InvalidEntryException:
+                continue
+            entries.append(entry)
+        return entries
+
+    _add('Entry.interpret', benchutil.time_func(_interpret_all, repeat))
+
+    entries = _interpret_all()
+    if len(entries) != size:
+        raise Exception("Expected %d entries, got %d." %
+                        (size, len(entries)))
+
+    def _format_all():
+        for entry in entries:
+            format_entry(entry, limit=300)
+
+    _add('format_entry', benchutil.time_func(_format_all, repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmarks SiloRider's feed parsing throughput.")
+    benchutil.add_common_args(parser)
+    feedgen.add_feed_args(parser)
+    parser.add_argument(
+        '--sizes',
+        type=int,
+        nargs='+',
+        default=default_feed_sizes,
+        help="The feed sizes to benchmark.")
+    parser.add_argument(
+        '--mode',
+        default='default',
+        choices=['default', 'single'],
+        help="The parsing mode to use.")
+    args = parser.parse_args()
+
+    # Never hit the network.
+    silorider.format._disable_get_card_info = True
+
+    feed_kwargs = feedgen.get_feed_kwargs(args)
+    config = make_config(args.mode, args.class_rules)
+    results = benchutil.BenchResults('parse')
+    with tempfile.TemporaryDirectory(prefix='SiloRiderBench') as tmpdir:
+        for size in args.sizes:
+            html = feedgen.make_feed(size, **feed_kwargs)
+            feed_path = os.path.join(tmpdir, 'feed%d.html' % size)
+            with open(feed_path, 'w', encoding='utf8') as fp:
+                fp.write(html)
+            bench_feed(results, args.repeat, size, config, feed_path, html)
+    benchutil.finish(results, args)
+
+
+if __name__ == '__main__':
+    main()
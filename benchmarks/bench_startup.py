@@ -0,0 +1,149 @@
+""" Benchmarks SiloRider's startup time: import time per module, cold CLI
+    startup for each command, and end-to-end dry runs of the `process`
+    command on synthetic feeds of various sizes.
+
+    Run it from the repository root:
+
+        python benchmarks/bench_startup.py [--compare <previous results>]
+"""
+import os.path
+import sys
+import argparse
+import tempfile
+import subprocess
+import benchutil
+import feedgen
+
+
+import_modules = [
+    'silorider.main',
+    'silorider.config',
+    'silorider.cardinfo',
+    'silorider.fetch',
+    'silorider.format',
+    'silorider.metrics',
+    'silorider.parse',
+    'silorider.profiling',
+    'silorider.timing',
+    'silorider.cache.base',
+    'silorider.cache.readthrough',
+    'silorider.cache.sqlite',
+    'silorider.silos.base',
+    'silorider.silos.bluesky',
+    'silorider.silos.facebook',
+    'silorider.silos.mastodon',
+    'silorider.silos.print',
+    'silorider.silos.twitter',
+    'silorider.silos.webmention',
+    'silorider.commands.daemon',
+    'silorider.commands.process',
+    'silorider.commands.utils',
+]
+
+default_feed_sizes = [10, 100, 1000, 10000]
+
+_import_code = """
+import time
+start = time.perf_counter()
+import %s
+print(time.perf_counter() - start)
+"""
+
+
+def bench_imports(results, repeat):
+    env = benchutil.get_subprocess_env()
+    for mod_name in import_modules:
+        timings = []
+        for _ in range(repeat):
+            out = subprocess.check_output(
+                [sys.executable, '-c', _import_code % mod_name], env=env)
+            timings.append(float(out.decode('utf8').strip()))
+        results.add('import:%s' % mod_name, timings)
+
+
+def bench_cli_help(results, repeat):
+    from silorider.main import commands
+    for cmd_name in commands:
+        timings = benchutil.time_subprocess(
+            ['-m', 'silorider.main', cmd_name, '--help'], repeat)
+        results.add('cli:%s --help' % cmd_name, timings)
+
+
+def _write_config(tmpdir, feed_path):
+    cfg_path = os.path.join(tmpdir, 'silorider.cfg')
+    with open(cfg_path, 'w', encoding='utf8') as fp:
+        fp.write("[cache]\n")
+        fp.write("uri=sqlite://%s\n" % os.path.join(tmpdir, 'silorider.db'))
+        fp.write("[silo:bench]\n")
+        fp.write("type=mastodon\n")
+        fp.write("url=https://mastodon.example.org\n")
+        fp.write("[urls]\n")
+        fp.write("bench=%s\n" % feed_path)
+    return cfg_path
+
+
+def bench_cli_commands(results, repeat):
+    # Cold startup of the non-interactive commands on a tiny feed, so
+    # that it's mostly about loading everything. The `forget` command
+    # isn't finished yet, so we only get its `--help` startup time.
+    with tempfile.TemporaryDirectory(prefix='SiloRiderBench') as tmpdir:
+        feed_path = feedgen.write_feed(
+            os.path.join(tmpdir, 'feed.html'), 1)
+        cfg_path = _write_config(tmpdir, feed_path)
+        cmds = [
+            ['process', '--dry-run'],
+            ['populate', '--dry-run'],
+            ['daemon', '--dry-run', '--max-polls', '1'],
+        ]
+        for cmd in cmds:
+            timings = benchutil.time_subprocess(
+                ['-m', 'silorider.main', '-c', cfg_path] + cmd, repeat)
+            results.add('cli:%s' % ' '.join(cmd), timings)
+
+
+def bench_process_feeds(results, repeat, sizes):
+    with tempfile.TemporaryDirectory(prefix='SiloRiderBench') as tmpdir:
+        for size in sizes:
+            feed_path = feedgen.write_feed(
+                os.path.join(tmpdir, 'feed%d.html' % size), size)
+            cfg_path = _write_config(tmpdir, feed_path)
+            timings = benchutil.time_subprocess(
+                ['-m', 'silorider.main', '-c', cfg_path,
+                 'process', '--dry-run'],
+                repeat)
+            results.add(
+                'process --dry-run:%d entries' % size, timings,
+                entries_per_sec=size / min(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmarks SiloRider's startup time.")
+    benchutil.add_common_args(parser)
+    parser.add_argument(
+        '--sizes',
+        type=int,
+        nargs='+',
+        default=default_feed_sizes,
+        help="The feed sizes to use for the end-to-end benchmarks.")
+    parser.add_argument(
+        '--skip',
+        action='append',
+        default=[],
+        choices=['imports', 'cli', 'process'],
+        help="Skip some of the benchmarks.")
+    args = parser.parse_args()
+
+    results = benchutil.BenchResults('startup')
+    if 'imports' not in args.skip:
+        bench_imports(results, args.repeat)
+    if 'cli' not in args.skip:
+        bench_cli_help(results, args.repeat)
+        bench_cli_commands(results, args.repeat)
+    if 'process' not in args.skip:
+        bench_process_feeds(results, args.repeat, args.sizes)
+    benchutil.finish(results, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+import os
+import os.path
+import sys
+import json
+import time
+import platform
+import statistics
+import subprocess
+
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+results_dir = os.path.join(repo_dir, 'benchmarks', 'results')
+
+# Make sure we benchmark this checkout of SiloRider, and not whatever
+# version is installed.
+if repo_dir not in sys.path:
+    sys.path.insert(0, repo_dir)
+
+
+def get_subprocess_env():
+    env = dict(os.environ)
+    pypath = env.get('PYTHONPATH')
+    env['PYTHONPATH'] = repo_dir + (os.pathsep + pypath if pypath else '')
+    return env
+
+
+def time_func(func, repeat=5):
+    """ Calls `func` several times and returns the timings, in seconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def time_subprocess(args, repeat=5, cwd=None):
+    """ Runs a Python subprocess several times and returns the timings,
+        in seconds.
+    """
+    env = get_subprocess_env()
+
+    def _run():
+        res = subprocess.run(
+            [sys.executable] + args,
+            cwd=cwd, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if res.returncode != 0:
+            raise Exception("Command failed: %s\n%s" %
+                            (args, res.stderr.decode('utf8', 'replace')))
+
+    return time_func(_run, repeat)
+
+
+def summarize(timings):
+    return {
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'max': max(timings),
+        'runs': len(timings)}
+
+
+class BenchResults:
+    def __init__(self, suite):
+        self.suite = suite
+        self.results = {}
+
+    def add(self, name, timings, **extra):
+        res = summarize(timings)
+        res.update(extra)
+        self.results[name] = res
+        print("%-48s %9.2fms (min %.2fms)%s" % (
+            name, res['median'] * 1000, res['min'] * 1000,
+            ''.join([', %s=%s' % (k, _fmt(v)) for k, v in extra.items()])))
+        return res
+
+    def save(self, path=None):
+        if path is None:
+            os.makedirs(results_dir, exist_ok=True)
+            path = os.path.join(results_dir, '%s-%s.json' % (
+                self.suite, time.strftime('%Y%m%d-%H%M%S')))
+        data = {
+            'suite': self.suite,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'results': self.results}
+        with open(path, 'w', encoding='utf8') as fp:
+            json.dump(data, fp, indent=2, sort_keys=True)
+        print("Saved results to: %s" % path)
+        return path
+
+    def compare(self, path):
+        with open(path, 'r', encoding='utf8') as fp:
+            prev = json.load(fp)['results']
+
+        print()
+        print("Comparing with: %s" % path)
+        print("%-48s %10s %10s %8s" % ("", "before", "after", "ratio"))
+        for name, res in self.results.items():
+            prev_res = prev.get(name)
+            if prev_res is None:
+                continue
+            before = prev_res['median']
+            after = res['median']
+            print("%-48s %8.2fms %8.2fms %7.2fx" % (
+                name, before * 1000, after * 1000,
+                after / before if before else float('inf')))
+
+
+def _fmt(v):
+    if isinstance(v, float):
+        return '%.1f' % v
+    return str(v)
+
+
+def add_common_args(parser):
+    parser.add_argument(
+        '-n', '--repeat',
+        type=int,
+        default=5,
+        help="How many times to run each benchmark.")
+    parser.add_argument(
+        '-o', '--output',
+        help=("Where to save the results. Defaults to a timestamped file "
+              "in `benchmarks/results`."))
+    parser.add_argument(
+        '--compare',
+        help="A previous results file to compare against.")
+
+
+def finish(results, args):
+    results.save(args.output)
+    if args.compare:
+        results.compare(args.compare)
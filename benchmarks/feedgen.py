@@ -0,0 +1,145 @@
+""" Generates synthetic h-feed pages for benchmarking.
+"""
+import datetime
+
+
+# The rewrite rules to use, as a `[classes:<feed name>]` configuration
+# section, for feeds generated with `class_rules=True`. Those feeds don't
+# have any microformats markup, so they can only be parsed with these.
+CLASS_RULES = {
+    '.post-list': 'h-feed',
+    '.post': 'h-entry',
+    '.post-title': 'p-name',
+    '.post-text': 'e-content',
+    '.post-link': 'u-url',
+    '.post-photo': 'u-photo',
+    '.post-date': 'dt-published',
+}
+
+_mf2_classes = {
+    'list': 'h-feed',
+    'entry': 'h-entry',
+    'title': 'p-name',
+    'text': 'e-content',
+    'link': 'u-url',
+    'photo': 'u-photo',
+    'date': 'dt-published',
+}
+
+_rules_classes = {
+    'list': 'post-list',
+    'entry': 'post',
+    'title': 'post-title',
+    'text': 'post-text',
+    'link': 'post-link',
+    'photo': 'post-photo',
+    'date': 'post-date',
+}
+
+_lorem = ("Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do "
+          "eiusmod tempor incididunt ut labore et dolore magna aliqua.")
+
+
+def make_feed(num_entries, *, base_url='https://example.org',
+              nesting=0, photos=0, links=0, articles=False,
+              class_rules=False, photo_url=None):
+    """ Makes an h-feed page with `num_entries` entries.
+
+        - `nesting`: how many extra `<div>`s to wrap each entry in.
+        - `photos`: how many `u-photo` images each entry has.
+        - `links`: how many links each entry's content has.
+        - `articles`: make articles (with a title and some content) instead
+          of microposts.
+        - `class_rules`: don't use microformats markup, so that the feed
+          needs the `CLASS_RULES` rewrite rules to be parsed.
+        - `photo_url`: the URL of all photos, e.g. a `file://` URL to a
+          local image. Defaults to a different URL for each photo.
+    """
+    cls = _rules_classes if class_rules else _mf2_classes
+    start_dt = datetime.datetime(2020, 1, 1, 12, 0, 0)
+
+    out = ['<html><head><title>Benchmark feed</title></head>',
+           '<body class="%s">' % cls['list']]
+    # Newest entries first, like most blogs.
+    for i in reversed(range(num_entries)):
+        dt = start_dt + datetime.timedelta(hours=i)
+        entry_url = '%s/%05d.html' % (base_url, i)
+
+        out.append('<div class="wrapper">' * nesting)
+        out.append('<article class="%s">' % cls['entry'])
+
+        if articles:
+            out.append('<h2 class="%s">Article number %d</h2>' %
+                       (cls['title'], i))
+        out.append('<div class="%s">' % cls['text'])
+        if articles:
+            out.append('<p>%s</p>' % _lorem)
+            out.append('<p>%s</p>' % _lorem)
+        else:
+            out.append('<p>This is quick update number %d.</p>' % i)
+        if links:
+            out.append('<p>%s</p>' % ' '.join([
+                '<a href="%s/links/%05d-%d.html">link %d</a>' %
+                (base_url, i, li, li)
+                for li in range(links)]))
+        out.append('</div>')
+
+        for pi in range(photos):
+            src = photo_url or ('%s/photos/%05d-%d.jpg' % (base_url, i, pi))
+            out.append('<img class="%s" src="%s" alt="Photo %d"/>' %
+                       (cls['photo'], src, pi))
+
+        if class_rules:
+            out.append('<span class="%s">%s</span>' %
+                       (cls['date'], dt.strftime('%Y-%m-%d %H:%M:%S')))
+        else:
+            out.append('<time class="%s" datetime="%s">%s</time>' %
+                       (cls['date'], dt.isoformat(), dt.strftime('%c')))
+        out.append('<a class="%s" href="%s">permalink</a>' %
+                   (cls['link'], entry_url))
+
+        out.append('</article>')
+        out.append('</div>' * nesting)
+    out.append('</body></html>')
+    return '\n'.join(out)
+
+
+def write_feed(path, num_entries, **kwargs):
+    with open(path, 'w', encoding='utf8') as fp:
+        fp.write(make_feed(num_entries, **kwargs))
+    return path
+
+
+def add_feed_args(parser):
+    parser.add_argument(
+        '--nesting',
+        type=int,
+        default=0,
+        help="How many extra elements to wrap each entry in.")
+    parser.add_argument(
+        '--photos',
+        type=int,
+        default=0,
+        help="How many photos each entry has.")
+    parser.add_argument(
+        '--links',
+        type=int,
+        default=0,
+        help="How many links each entry has.")
+    parser.add_argument(
+        '--articles',
+        action='store_true',
+        help="Generate articles instead of microposts.")
+    parser.add_argument(
+        '--class-rules',
+        action='store_true',
+        help="Generate a feed that needs class rewrite rules.")
+
+
+def get_feed_kwargs(args):
+    return {
+        'nesting': args.nesting,
+        'photos': args.photos,
+        'links': args.links,
+        'articles': args.articles,
+        'class_rules': args.class_rules}
@@ -20,6 +20,7 @@ install_requires = [
     'python-dateutil>=2.7.0',
     'python-facebook-api>=0.17.1',
     'python-twitter>=3.4.0',
+    'requests>=2.30.0',
     'ronkyuu>=0.6',
     'tweepy>=4.14.0'
 ]
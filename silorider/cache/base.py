@@ -1,6 +1,7 @@
 import os.path
 import urllib.parse
 import logging
+import contextlib
 
 
 logger = logging.getLogger(__name__)
@@ -16,9 +17,29 @@ class Cache:
     def wasPosted(self, silo_name, entry_uri):
         raise NotImplementedError()
 
+    def getPostedUris(self, silo_name, entry_uris):
+        """ Returns the subset of the given URIs that were posted to the
+            given silo.
+        """
+        return set([u for u in entry_uris if self.wasPosted(silo_name, u)])
+
+    def getAllPostedUris(self, silo_name):
+        raise NotImplementedError()
+
     def addPost(self, silo_name, entry_uri):
         raise NotImplementedError()
 
+    def addPosts(self, silo_name, entry_uris):
+        for entry_uri in entry_uris:
+            self.addPost(silo_name, entry_uri)
+
+    @contextlib.contextmanager
+    def batch(self):
+        """ Groups all writes made inside this context, so backends can
+            save them in one go.
+        """
+        yield self
+
 
 class NullCache(Cache):
     def __init__(self):
@@ -33,11 +54,22 @@ class NullCache(Cache):
     def wasPosted(self, silo_name, entry_uri):
         return False
 
+    def getPostedUris(self, silo_name, entry_uris):
+        return set()
+
+    def getAllPostedUris(self, silo_name):
+        return set()
+
     def addPost(self, silo_name, entry_uri):
         pass
 
 
-def load_cache(config, cfg_dir):
+def load_cache(config, cfg_dir, read_through=False):
+    """ Loads the configured cache. If `read_through` is set, the posted
+        URIs are loaded in memory (see `ReadThroughCache`), which only pays
+        off for long-running commands. The `[cache] read_through` setting
+        overrides it.
+    """
     if not config.has_section('cache'):
         logger.warning("No cache configured!")
         return NullCache()
@@ -46,15 +78,23 @@ def load_cache(config, cfg_dir):
     if not cache_uri:
         return NullCache()
 
+    # Whether to keep posted URIs in memory as compact keys instead of
+    # full strings.
+    compact = config.getboolean('cache', 'compact_uris', fallback=False)
+
     res = urllib.parse.urlparse(cache_uri)
     if res.scheme == 'sqlite':
         from .sqlite import SqliteCache
         dbpath = res.netloc + res.path
         if cfg_dir:
             dbpath = os.path.join(cfg_dir, dbpath)
-        return SqliteCache(dbpath, config)
+        cache = SqliteCache(dbpath, config)
+        if config.getboolean('cache', 'read_through', fallback=read_through):
+            from .readthrough import ReadThroughCache
+            cache = ReadThroughCache(cache, compact=compact)
+        return cache
     elif res.scheme == 'memory':
         from .memory import MemoryCache
-        return MemoryCache()
+        return MemoryCache(compact=compact)
 
     raise Exception("Unknown cache URI: %s" % cache_uri)
@@ -1,10 +1,12 @@
 from .base import Cache
+from .urikeys import UriKeySet
 
 
 class MemoryCache(Cache):
-    def __init__(self):
+    def __init__(self, compact=False):
         self._vals = {}
         self._posted = {}
+        self._uri_set_class = UriKeySet if compact else set
 
     def getCustomValue(self, name, valtype=str):
         return self._vals.get(name)
@@ -18,6 +20,22 @@ class MemoryCache(Cache):
             return entry_uri in uris
         return False
 
+    def getPostedUris(self, silo_name, entry_uris):
+        uris = self._posted.get(silo_name)
+        if uris:
+            return uris.intersection(entry_uris)
+        return set()
+
+    def getAllPostedUris(self, silo_name):
+        uris = self._posted.get(silo_name)
+        if uris is not None:
+            return uris.copy()
+        return self._uri_set_class()
+
     def addPost(self, silo_name, entry_uri):
-        uris = self._posted.setdefault(silo_name, set())
+        uris = self._posted.setdefault(silo_name, self._uri_set_class())
         uris.add(entry_uri)
+
+    def addPosts(self, silo_name, entry_uris):
+        uris = self._posted.setdefault(silo_name, self._uri_set_class())
+        uris.update(entry_uris)
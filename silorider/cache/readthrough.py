@@ -0,0 +1,81 @@
+import logging
+import threading
+import contextlib
+from .base import Cache
+from .urikeys import UriKeySet
+
+
+logger = logging.getLogger(__name__)
+
+
+class ReadThroughCache(Cache):
+    """ A cache that wraps another cache, and keeps in memory what it reads
+        from it. Posted entries are loaded one whole silo at a time, and
+        optionally kept as compact URI keys. Writes go through to the
+        wrapped cache immediately.
+    """
+    def __init__(self, backend, compact=False):
+        self.backend = backend
+        self.compact = compact
+        self._vals = {}
+        self._posted = {}
+        self._lock = threading.RLock()
+
+    def getCustomValue(self, name, valtype=str):
+        key = (name, valtype)
+        with self._lock:
+            try:
+                return self._vals[key]
+            except KeyError:
+                pass
+            val = self.backend.getCustomValue(name, valtype=valtype)
+            self._vals[key] = val
+            return val
+
+    def setCustomValue(self, name, val):
+        with self._lock:
+            self.backend.setCustomValue(name, val)
+            for key in [k for k in self._vals if k[0] == name]:
+                del self._vals[key]
+            self._vals[(name, type(val))] = val
+
+    def wasPosted(self, silo_name, entry_uri):
+        return entry_uri in self._getPosted(silo_name)
+
+    def getPostedUris(self, silo_name, entry_uris):
+        return self._getPosted(silo_name).intersection(entry_uris)
+
+    def getAllPostedUris(self, silo_name):
+        return self._getPosted(silo_name).copy()
+
+    def addPost(self, silo_name, entry_uri):
+        with self._lock:
+            self.backend.addPost(silo_name, entry_uri)
+            posted = self._posted.get(silo_name)
+            if posted is not None:
+                posted.add(entry_uri)
+
+    def addPosts(self, silo_name, entry_uris):
+        entry_uris = list(entry_uris)
+        with self._lock:
+            self.backend.addPosts(silo_name, entry_uris)
+            posted = self._posted.get(silo_name)
+            if posted is not None:
+                posted.update(entry_uris)
+
+    @contextlib.contextmanager
+    def batch(self):
+        with self.backend.batch():
+            yield self
+
+    def _getPosted(self, silo_name):
+        with self._lock:
+            posted = self._posted.get(silo_name)
+            if posted is None:
+                posted = self.backend.getAllPostedUris(silo_name)
+                if self.compact and not isinstance(posted, UriKeySet):
+                    posted = UriKeySet(posted)
+                logger.debug("Loaded %d posted entries for '%s'" %
+                             (len(posted), silo_name))
+                self._posted[silo_name] = posted
+            return posted
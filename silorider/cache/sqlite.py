@@ -1,13 +1,17 @@
-import os.path
 import logging
+import threading
+import contextlib
 from .base import Cache
+from .urikeys import get_uri_key
 
 
 logger = logging.getLogger(__name__)
 
 
 class SqliteCache(Cache):
-    SCHEMA_VERSION = 1
+    SCHEMA_VERSION = 3
+    MAX_QUERY_VARS = 500
+    MAX_BATCH_ROWS = 1000
 
     def __init__(self, dbpath, config):
         self.path = dbpath
@@ -15,12 +19,37 @@ class SqliteCache(Cache):
 
         import sqlite3
         logger.debug("Opening SQL DB: %s" % dbpath)
+        # The connection can be shared between threads as long as we
+        # serialize access to it ourselves.
         self.conn = sqlite3.connect(dbpath,
-                                    detect_types=sqlite3.PARSE_DECLTYPES)
+                                    detect_types=sqlite3.PARSE_DECLTYPES,
+                                    check_same_thread=False)
+        self.conn.create_function('uri_key', 1, get_uri_key,
+                                  deterministic=True)
+        self._lock = threading.RLock()
+        self._batch_depth = 0
+        self._batch_rows = 0
+        self._setPragmas()
 
-        if (not os.path.exists(dbpath) or
-                self._getSchemaVersion() != self.SCHEMA_VERSION):
+        schema_version = self._getSchemaVersion()
+        if schema_version is None:
             self._initDb()
+        elif schema_version < self.SCHEMA_VERSION:
+            self._migrateDb(schema_version)
+        elif schema_version > self.SCHEMA_VERSION:
+            raise Exception(
+                "Cache was created by a newer version of SiloRider: %s" %
+                dbpath)
+
+    def _setPragmas(self):
+        c = self.conn.cursor()
+        # Write-ahead logging lets readers and writers work concurrently,
+        # and only needs a full sync on checkpoints.
+        c.execute('''PRAGMA journal_mode=WAL''')
+        c.execute('''PRAGMA synchronous=NORMAL''')
+        c.execute('''PRAGMA temp_store=MEMORY''')
+        c.execute('''PRAGMA cache_size=-8192''')
+        c.close()
 
     def _getSchemaVersion(self):
         import sqlite3
@@ -50,73 +79,189 @@ class SqliteCache(Cache):
                 id integer PRIMARY KEY,
                 silo text NOT NULL,
                 uri text NOT NULL,
-                posted_on timestamp
+                posted_on timestamp,
+                uri_key integer
             )''')
+        # Posts are only indexed by their URI key, to keep the index small.
+        # See `addPosts` for how duplicates are avoided.
         c.execute(
-            '''CREATE INDEX index_silo ON posted(silo)''')
-        c.execute(
-            '''CREATE INDEX index_uri ON posted(uri)''')
+            '''CREATE INDEX index_silo_uri_key ON posted(silo, uri_key)''')
         self.conn.commit()
         c.close()
 
-    def getCustomValue(self, name, valtype=str):
+    def _migrateDb(self, from_version):
+        logger.info("Upgrading cache from schema version %d to %d" %
+                    (from_version, self.SCHEMA_VERSION))
         c = self.conn.cursor()
-        if valtype is str:
-            c.execute(
-                '''SELECT str_val FROM info WHERE (name = ?)''', (name,))
-        elif valtype is float:
-            c.execute(
-                '''SELECT real_val FROM info WHERE (name = ?)''', (name,))
-        elif valtype in (int, bool):
+        try:
+            c.execute('''BEGIN''')
+            for version in range(from_version, self.SCHEMA_VERSION):
+                migrate_func = getattr(self, '_migrateFromV%d' % version)
+                migrate_func(c)
             c.execute(
-                '''SELECT int_val FROM info WHERE (name = ?)''', (name,))
-        else:
-            raise Exception("Unsupported value type: %s" % valtype)
-        row = c.fetchone()
-        if row is None:
-            return None
+                '''UPDATE info SET int_val = ?
+                    WHERE (name = 'schema_version')''',
+                (self.SCHEMA_VERSION,))
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            c.close()
 
-        return valtype(row[0])
+    def _migrateFromV1(self, c):
+        # Remove duplicate posts, and replace the separate indices with a
+        # unique composite one.
+        c.execute(
+            '''DELETE FROM posted
+                WHERE id NOT IN (
+                    SELECT MIN(id) FROM posted GROUP BY silo, uri)''')
+        c.execute('''DROP INDEX IF EXISTS index_silo''')
+        c.execute('''DROP INDEX IF EXISTS index_uri''')
+        c.execute(
+            '''CREATE UNIQUE INDEX index_silo_uri ON posted(silo, uri)''')
+
+    def _migrateFromV2(self, c):
+        # Index posts by an integer key computed from their URI, instead of
+        # by the full URI string. We still compare the full URI when
+        # querying, in case two URIs have the same key. The new index isn't
+        # unique: the old one kept duplicates out so far, and `addPosts`
+        # does it from now on.
+        c.execute('''ALTER TABLE posted ADD COLUMN uri_key integer''')
+        c.execute('''UPDATE posted SET uri_key = uri_key(uri)''')
+        c.execute('''DROP INDEX IF EXISTS index_silo_uri''')
+        c.execute(
+            '''CREATE INDEX index_silo_uri_key ON posted(silo, uri_key)''')
+
+    def getCustomValue(self, name, valtype=str):
+        with self._lock:
+            c = self.conn.cursor()
+            if valtype is str:
+                c.execute(
+                    '''SELECT str_val FROM info WHERE (name = ?)''', (name,))
+            elif valtype is float:
+                c.execute(
+                    '''SELECT real_val FROM info WHERE (name = ?)''', (name,))
+            elif valtype in (int, bool):
+                c.execute(
+                    '''SELECT int_val FROM info WHERE (name = ?)''', (name,))
+            else:
+                raise Exception("Unsupported value type: %s" % valtype)
+            row = c.fetchone()
+            if row is None:
+                return None
+
+            return valtype(row[0])
 
     def setCustomValue(self, name, val):
-        c = self.conn.cursor()
-        if isinstance(val, str):
-            c.execute(
-                '''INSERT OR REPLACE INTO info (name, str_val)
-                    VALUES (?, ?)''',
-                (name, val))
-        elif isinstance(val, float):
-            c.execute(
-                '''INSERT OR REPLACE INTO info (name, real_val)
-                    VALUES (?, ?)''',
-                (name, str(val)))
-        elif isinstance(val, (int, bool)):
-            c.execute(
-                '''INSERT OR REPLACE INTO info (name, int_val)
-                    VALUES (?, ?)''',
-                (name, str(int(val))))
-        else:
-            raise Exception("Unsupported value type: %s" % type(val))
+        with self._lock:
+            c = self.conn.cursor()
+            if isinstance(val, str):
+                c.execute(
+                    '''INSERT OR REPLACE INTO info (name, str_val)
+                        VALUES (?, ?)''',
+                    (name, val))
+            elif isinstance(val, float):
+                c.execute(
+                    '''INSERT OR REPLACE INTO info (name, real_val)
+                        VALUES (?, ?)''',
+                    (name, str(val)))
+            elif isinstance(val, (int, bool)):
+                c.execute(
+                    '''INSERT OR REPLACE INTO info (name, int_val)
+                        VALUES (?, ?)''',
+                    (name, str(int(val))))
+            else:
+                raise Exception("Unsupported value type: %s" % type(val))
 
-        self.conn.commit()
-        c.close()
+            self._commit()
+            c.close()
 
     def wasPosted(self, silo_name, entry_uri):
-        c = self.conn.cursor()
-        c.execute(
-            '''SELECT id, silo, uri
-                FROM posted
-                WHERE (silo = ? AND uri = ?)''',
-            (silo_name, entry_uri))
-        if c.fetchone():
-            return True
-        return False
+        with self._lock:
+            c = self.conn.cursor()
+            c.execute(
+                '''SELECT id
+                    FROM posted
+                    WHERE (silo = ? AND uri_key = ? AND uri = ?)''',
+                (silo_name, get_uri_key(entry_uri), entry_uri))
+            if c.fetchone():
+                return True
+            return False
+
+    def getPostedUris(self, silo_name, entry_uris):
+        entry_uris = set(entry_uris)
+        keys = list(set([get_uri_key(u) for u in entry_uris]))
+        posted = set()
+        with self._lock:
+            c = self.conn.cursor()
+            # Don't go over SQLite's limit on the number of variables.
+            for i in range(0, len(keys), self.MAX_QUERY_VARS):
+                chunk = keys[i:i + self.MAX_QUERY_VARS]
+                c.execute(
+                    '''SELECT uri
+                        FROM posted
+                        WHERE (silo = ? AND uri_key IN (%s))''' %
+                    ','.join('?' * len(chunk)),
+                    [silo_name] + chunk)
+                posted.update([row[0] for row in c.fetchall()])
+            c.close()
+        # Only keep actual matches, in case of key collisions.
+        return posted.intersection(entry_uris)
+
+    def getAllPostedUris(self, silo_name):
+        with self._lock:
+            c = self.conn.cursor()
+            c.execute(
+                '''SELECT uri FROM posted WHERE (silo = ?)''',
+                (silo_name,))
+            posted = set([row[0] for row in c.fetchall()])
+            c.close()
+        return posted
 
     def addPost(self, silo_name, entry_uri):
-        c = self.conn.cursor()
-        c.execute(
-            '''INSERT INTO posted (silo, uri)
-                VALUES (?, ?)''',
-            (silo_name, entry_uri))
+        self.addPosts(silo_name, [entry_uri])
+
+    def addPosts(self, silo_name, entry_uris):
+        rows = []
+        for u in entry_uris:
+            key = get_uri_key(u)
+            rows.append((silo_name, u, key, silo_name, key, u))
+        with self._lock:
+            c = self.conn.cursor()
+            # The index isn't unique (it would need to include the full
+            # URIs for that, which would make it bigger than the one it
+            # replaced), so skip posts we already have.
+            c.executemany(
+                '''INSERT INTO posted (silo, uri, uri_key)
+                    SELECT ?, ?, ?
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM posted
+                        WHERE (silo = ? AND uri_key = ? AND uri = ?))''',
+                rows)
+            self._commit(len(rows))
+            c.close()
+
+    @contextlib.contextmanager
+    def batch(self):
+        with self._lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                if self._batch_depth == 0 and self._batch_rows > 0:
+                    logger.debug("Committing %d batched rows." %
+                                 self._batch_rows)
+                    self.conn.commit()
+                    self._batch_rows = 0
+
+    def _commit(self, row_count=1):
+        # Inside a batch, only commit every so often.
+        if self._batch_depth > 0:
+            self._batch_rows += row_count
+            if self._batch_rows < self.MAX_BATCH_ROWS:
+                return
         self.conn.commit()
-        c.close()
+        self._batch_rows = 0
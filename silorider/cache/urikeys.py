@@ -0,0 +1,96 @@
+import heapq
+import array
+import bisect
+import hashlib
+
+
+def get_uri_key(uri):
+    """ Returns a signed 64-bit integer key for the given URI, suitable for
+        storing in a SQLite integer column.
+    """
+    digest = hashlib.blake2b(uri.encode('utf8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+class UriKeySet:
+    """ A set of URIs that only stores a 64-bit key for each of them, in a
+        sorted array, instead of the full strings.
+
+        Collisions can only be detected between the URIs given when the
+        set is created: those are kept as full strings, and checked
+        exactly. Otherwise, membership is based on the key only. This
+        includes URIs added later with `add`, since the set doesn't know
+        which URI a key came from. So any URI whose key collides with that
+        of a URI in the set is reported as present. This is a false
+        positive, but it is astronomically unlikely with 64-bit keys.
+    """
+    MAX_PENDING = 1024
+
+    def __init__(self, uris=None):
+        self._keys = array.array('q')
+        self._pending = set()
+        self._collisions = {}
+        if uris:
+            self._build(uris)
+
+    def _build(self, uris):
+        first_uris = {}
+        for uri in uris:
+            key = get_uri_key(uri)
+            first_uri = first_uris.setdefault(key, uri)
+            if first_uri != uri:
+                self._collisions.setdefault(key, set([first_uri])).add(uri)
+        self._keys = array.array('q', sorted(first_uris.keys()))
+
+    def __contains__(self, uri):
+        key = get_uri_key(uri)
+        collided = self._collisions.get(key)
+        if collided is not None:
+            return uri in collided
+        return self._hasKey(key)
+
+    def __len__(self):
+        extra = sum([len(c) - 1 for c in self._collisions.values()])
+        return len(self._keys) + len(self._pending) + extra
+
+    def add(self, uri):
+        key = get_uri_key(uri)
+        collided = self._collisions.get(key)
+        if collided is not None:
+            collided.add(uri)
+            return
+
+        if self._hasKey(key):
+            # Either this URI is already in the set, or it collides with
+            # one that is. We can't tell which.
+            return
+
+        self._pending.add(key)
+        if len(self._pending) >= self.MAX_PENDING:
+            self._mergePending()
+
+    def update(self, uris):
+        for uri in uris:
+            self.add(uri)
+
+    def intersection(self, uris):
+        return set([u for u in uris if u in self])
+
+    def copy(self):
+        res = UriKeySet()
+        res._keys = array.array('q', self._keys)
+        res._pending = set(self._pending)
+        res._collisions = dict([(k, set(v))
+                                for k, v in self._collisions.items()])
+        return res
+
+    def _hasKey(self, key):
+        if key in self._pending:
+            return True
+        idx = bisect.bisect_left(self._keys, key)
+        return idx < len(self._keys) and self._keys[idx] == key
+
+    def _mergePending(self):
+        merged = heapq.merge(self._keys, sorted(self._pending))
+        self._keys = array.array('q', merged)
+        self._pending = set()
@@ -0,0 +1,190 @@
+import re
+import json
+import codecs
+import logging
+import threading
+import html.parser
+from . import fetch
+
+
+logger = logging.getLogger(__name__)
+
+
+class CardMetaCache:
+    """ Keeps the `<meta>` tags of the pages we looked at for card info,
+        so that a page is only downloaded once per run, even when it's
+        posted to several silos.
+
+        If given a SiloRider cache, the meta tags are also stored there,
+        along with the page's HTTP validators, so that next time we only
+        need a conditional request to know they're still good.
+    """
+    def __init__(self, cache=None):
+        self.cache = cache
+        self._metas = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    def getMeta(self, url, meta_attr, name):
+        return self.getPageMetas(url).get(meta_attr, {}).get(name)
+
+    def getPageMetas(self, url):
+        with self._getKeyLock(url):
+            metas = self._metas.get(url)
+            if metas is None:
+                metas = self._loadPageMetas(url)
+                self._metas[url] = metas
+            else:
+                logger.debug("Re-using card info for: %s" % url)
+            return metas
+
+    def _getKeyLock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _loadPageMetas(self, url):
+        stored = self._getStored(url)
+
+        headers = {}
+        if stored:
+            if stored.get('etag'):
+                headers['If-None-Match'] = stored['etag']
+            if stored.get('last_modified'):
+                headers['If-Modified-Since'] = stored['last_modified']
+
+        logger.debug("Downloading entry page to check meta entries: %s" % url)
+        with fetch.http_get(url, headers=headers, stream=True) as resp:
+            if resp.status_code == 304 and stored:
+                logger.debug("Entry page wasn't modified: %s" % url)
+                return stored['metas']
+
+            resp.raise_for_status()
+            metas = read_head_metas(resp)
+
+        self._setStored(url, metas,
+                        resp.headers.get('ETag'),
+                        resp.headers.get('Last-Modified'))
+        return metas
+
+    def _getStored(self, url):
+        if self.cache is None:
+            return None
+        raw = self.cache.getCustomValue('card:%s' % url)
+        if not raw:
+            return None
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return None
+
+    def _setStored(self, url, metas, etag, last_modified):
+        if self.cache is None or not (etag or last_modified):
+            return
+        self.cache.setCustomValue('card:%s' % url, json.dumps({
+            'etag': etag,
+            'last_modified': last_modified,
+            'metas': metas}))
+
+
+class HeadMetaParser(html.parser.HTMLParser):
+    """ Collects the `<meta>` tags of an HTML document's head, and stops
+        as soon as the head is over. Feed it chunks of the document until
+        `done` is set.
+    """
+    # Elements that can be found in a document's head. Anything else
+    # means the head is implicitly closed.
+    HEAD_TAGS = set(['html', 'head', 'meta', 'link', 'title', 'style',
+                     'script', 'noscript', 'base', 'template'])
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.metas = {}
+        self.done = False
+
+    def feed(self, data):
+        if not self.done:
+            super().feed(data)
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if tag not in self.HEAD_TAGS:
+            self.done = True
+            return
+        if tag != 'meta':
+            return
+
+        attrs = dict(attrs)
+        content = attrs.get('content')
+        if content is None:
+            return
+        for meta_attr in ('name', 'property'):
+            meta_name = attrs.get(meta_attr)
+            if meta_name:
+                self.metas.setdefault(meta_attr, {}).setdefault(
+                    meta_name, content)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+
+    def handle_endtag(self, tag):
+        if tag in ('head', 'html'):
+            self.done = True
+
+
+# How many bytes to look at for a `<meta>` tag declaring the charset,
+# like browsers do.
+CHARSET_PRESCAN_SIZE = 1024
+
+_meta_charset_re = re.compile(
+    rb'<meta\s[^>]*charset\s*=\s*["\']?\s*([a-zA-Z0-9_.:-]+)', re.I)
+
+
+def read_head_metas(resp, chunk_size=8192):
+    """ Reads the given streamed response until the document's head is
+        over, and returns its `<meta>` tags as a dictionary of
+        dictionaries, first keyed by the attribute naming the tag (`name`
+        or `property`), and then by its value.
+    """
+    chunks = resp.iter_content(chunk_size=chunk_size)
+
+    # Read enough of the document to find out its charset.
+    start = b''
+    for chunk in chunks:
+        start += chunk
+        if len(start) >= CHARSET_PRESCAN_SIZE:
+            break
+    charset = _get_charset(resp, start)
+    decoder = codecs.getincrementaldecoder(charset)(errors='replace')
+
+    parser = HeadMetaParser()
+    parser.feed(decoder.decode(start))
+    if not parser.done:
+        for chunk in chunks:
+            parser.feed(decoder.decode(chunk))
+            if parser.done:
+                break
+        else:
+            parser.feed(decoder.decode(b'', final=True))
+            parser.close()
+    return parser.metas
+
+
+def _get_charset(resp, start):
+    # Same order as browsers: byte order mark, HTTP header, and then the
+    # document's own declaration.
+    if start.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    candidates = [fetch.get_content_charset(resp.headers)]
+    m = _meta_charset_re.search(start[:CHARSET_PRESCAN_SIZE])
+    if m:
+        candidates.append(m.group(1).decode('ascii'))
+    for charset in candidates:
+        if not charset:
+            continue
+        try:
+            codecs.lookup(charset)
+            return charset
+        except LookupError:
+            logger.debug("Unknown charset: %s" % charset)
+    return 'utf8'
@@ -0,0 +1,113 @@
+import time
+import random
+import signal
+import logging
+import threading
+from .utils import get_named_urls
+from .process import Processor
+from .. import metrics
+from ..profiling import profile_feed
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_INTERVAL = 15 * 60
+DEFAULT_JITTER = 60
+
+
+def run_daemon(ctx):
+    named_urls = get_named_urls(ctx.config, ctx.args.url)
+    if not named_urls:
+        logger.warning("No URLs to poll.")
+        return
+
+    has_metrics = metrics.setup(ctx.config)
+    metrics_server = metrics.start_http_server(ctx.config)
+
+    stop_event = threading.Event()
+    prev_handlers = _install_signal_handlers(stop_event)
+    try:
+        _run_schedule(ctx, named_urls, stop_event)
+    finally:
+        for signum, handler in prev_handlers.items():
+            signal.signal(signum, handler)
+        if metrics_server is not None:
+            metrics_server.shutdown()
+            metrics_server.server_close()
+        if has_metrics:
+            metrics.teardown()
+    logger.info("Stopping daemon.")
+
+
+def _run_schedule(ctx, named_urls, stop_event):
+    has_metrics = metrics.is_enabled(ctx.config)
+    # Poll all feeds right away, and then each on its own schedule.
+    now = time.monotonic()
+    schedule = [(now, name, url) for name, url in named_urls]
+    max_polls = ctx.args.max_polls
+    poll_count = 0
+
+    logger.info("Polling %d feeds, press Ctrl+C to stop." % len(schedule))
+    while not stop_event.is_set():
+        schedule.sort(key=lambda s: s[0])
+        next_time, name, url = schedule[0]
+
+        delay = next_time - time.monotonic()
+        if delay > 0:
+            logger.debug("Sleeping %.1fs until next poll of %s" %
+                         (delay, name))
+            if stop_event.wait(delay):
+                break
+
+        with profile_feed(ctx, name):
+            poll_feed(ctx, name, url)
+        if has_metrics:
+            metrics.export(ctx.config, 'daemon')
+        schedule[0] = (time.monotonic() + get_poll_interval(ctx.config, name),
+                       name, url)
+
+        poll_count += 1
+        if max_polls and poll_count >= max_polls:
+            break
+
+
+def poll_feed(ctx, name, url):
+    logger.info("Processing %s" % url)
+    try:
+        p = Processor(ctx, name, url)
+        if not p.process():
+            logger.info("Feed unchanged since last run: %s" % url)
+    except Exception as ex:
+        # Don't bring the whole daemon down because of one feed, we'll
+        # try again next time.
+        logger.error("Error processing %s" % url)
+        logger.error(ex)
+        if ctx.args.verbose:
+            raise
+
+
+def get_poll_interval(config, name):
+    interval = config.getfloat(
+        'daemon', 'interval_%s' % name,
+        fallback=config.getfloat('daemon', 'interval',
+                                 fallback=DEFAULT_INTERVAL))
+    jitter = config.getfloat('daemon', 'jitter', fallback=DEFAULT_JITTER)
+    if jitter > 0:
+        interval += random.uniform(0, jitter)
+    return interval
+
+
+def _install_signal_handlers(stop_event):
+    # Signal handlers can only be installed from the main thread.
+    if threading.current_thread() is not threading.main_thread():
+        return {}
+
+    def _on_signal(signum, frame):
+        logger.info("Received signal %d" % signum)
+        stop_event.set()
+
+    prev_handlers = {}
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        prev_handlers[signum] = signal.signal(signum, _on_signal)
+    return prev_handlers
@@ -1,18 +1,89 @@
+import json
+import hashlib
 import logging
+import concurrent.futures
 import dateparser
 from .utils import get_named_silos, get_named_urls
-from ..silos.base import SiloPostingContext, upload_silo_media
+from ..cardinfo import CardMetaCache
+from ..silos.base import SiloPostingContext, MediaStore, upload_silo_media
 from ..parse import parse_url
+from ..fetch import FetchCache
+from ..profiling import profile_feed, is_splitting_feeds
+from .. import timing, metrics
+from ..timing import timed
 
 
 logger = logging.getLogger(__name__)
 
 
 def process_urls(ctx):
-    for name, url in get_named_urls(ctx.config, ctx.args.url):
-        logger.info("Processing %s" % url)
-        p = Processor(ctx, name, url)
-        p.process()
+    recorder = None
+    if ctx.args.timings or ctx.args.timings_json:
+        recorder = timing.enable()
+    has_metrics = metrics.setup(ctx.config)
+    try:
+        _process_urls(ctx)
+    finally:
+        if has_metrics:
+            metrics.teardown()
+            metrics.export(ctx.config, 'process')
+        if recorder is not None:
+            timing.disable()
+            _report_timings(ctx, recorder)
+
+
+def _report_timings(ctx, recorder):
+    if ctx.args.timings:
+        logger.info("Timings:\n%s" % recorder.formatTable())
+    if ctx.args.timings_json:
+        logger.debug("Writing timings to: %s" % ctx.args.timings_json)
+        with open(ctx.args.timings_json, 'w', encoding='utf8') as fp:
+            fp.write(recorder.toJson())
+
+
+def _process_urls(ctx):
+    processors = [Processor(ctx, name, url)
+                  for name, url in get_named_urls(ctx.config, ctx.args.url)]
+
+    max_workers = ctx.config.getint('process', 'feed_workers', fallback=1)
+    if max_workers > 1 and is_splitting_feeds(ctx):
+        # The profiler only sees the current thread.
+        logger.warning("Processing feeds sequentially for profiling.")
+        max_workers = 1
+
+    if max_workers <= 1 or len(processors) <= 1:
+        for p in processors:
+            logger.info("Processing %s" % p.url)
+            with profile_feed(ctx, p.name):
+                if not p.process():
+                    logger.info("Feed unchanged since last run: %s" % p.url)
+        return
+
+    # Fetch and parse feeds concurrently, but post their entries one feed
+    # at a time, in order, as they become ready.
+    logger.debug("Fetching %d feeds with %d workers" %
+                 (len(processors), max_workers))
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+        futures = dict([(executor.submit(p.fetchFeed), p)
+                        for p in processors])
+        for future in concurrent.futures.as_completed(futures):
+            p = futures[future]
+            logger.info("Processing %s" % p.url)
+            if not p.processFeed(future.result()):
+                logger.info("Feed unchanged since last run: %s" % p.url)
+
+
+def get_config_fingerprint(config, name, silos):
+    """ Returns a digest of the parts of the configuration that change
+        what gets posted from the given feed: the silos, the class rules,
+        and the entry filters.
+    """
+    sections = {'silos': sorted([s.name for s in silos])}
+    for sec_name in ('classes:%s' % name, 'filter'):
+        if config.has_section(sec_name):
+            sections[sec_name] = sorted(config.items(sec_name))
+    raw = json.dumps(sections, sort_keys=True).encode('utf8')
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
 
 
 class Processor:
@@ -21,6 +92,21 @@ class Processor:
         self.name = name
         self.url = url
         self._silos = get_named_silos(ctx.silos, ctx.args.silo)
+        self._had_errors = False
+        self._silo_executor = None
+        self._media_store = None
+        self._posted_uris = {}
+        self._started_silos = {}
+
+        # We can only skip a feed that hasn't changed since the last run if
+        # that last run was a "full" run, i.e. it wasn't filtered in any
+        # way, otherwise we would miss entries that were never posted.
+        self.fetch_cache = None
+        if not (ctx.args.no_cache or ctx.args.silo or
+                ctx.args.since or ctx.args.until):
+            self.fetch_cache = FetchCache(
+                ctx.cache, get_config_fingerprint(ctx.config, name,
+                                                  self._silos))
 
     @property
     def config(self):
@@ -31,21 +117,94 @@ class Processor:
         return self._silos
 
     def process(self):
-        ok_silos = self.preProcess()
+        feed = self.fetchFeed()
+        return self.processFeed(feed)
+
+    def fetchFeed(self):
+        get_done_urls = None
+        stop_after_done = 0
+        if not self.ctx.args.no_cache:
+            stop_after_done = self.config.getint(
+                'parse', 'incremental', fallback=0)
+            if stop_after_done > 0:
+                get_done_urls = self.getUrlsPostedEverywhere
+
+        with timing.labels(feed=self.name):
+            feed = parse_url(self.url, self.name, self.config,
+                             fetch_cache=self.fetch_cache,
+                             skip_unchanged=True,
+                             get_done_urls=get_done_urls,
+                             stop_after_done=stop_after_done)
+        return feed
+
+    def processFeed(self, feed):
+        if feed.is_unchanged:
+            return False
+
+        with timing.labels(feed=self.name):
+            self._processFeed(feed)
+        return True
+
+    def _processFeed(self, feed):
+        silos = self.preProcess()
 
         # Get all silos to return a profile URL handler.
         profile_url_handlers = {}
-        for silo in ok_silos:
+        for silo in silos:
             handler = silo.getProfileUrlHandler()
             if handler:
                 profile_url_handlers[silo.SILO_TYPE] = handler
 
-        postctx = SiloPostingContext(self.ctx, profile_url_handlers)
-        feed = parse_url(self.url, self.name, self.config)
-        for entry in feed.entries:
-            self.processEntry(ok_silos, postctx, entry)
+        # Entry pages are downloaded at most once per run to get their
+        # card info, whatever the number of silos that need it.
+        card_cache = CardMetaCache()
+        if (not self.ctx.args.no_cache and not self.ctx.args.dry_run and
+                self.config.getboolean('cache', 'persist_card_info',
+                                       fallback=False)):
+            card_cache = CardMetaCache(self.ctx.cache)
+        postctx = SiloPostingContext(self.ctx, profile_url_handlers,
+                                     card_cache=card_cache)
+        max_workers = self.config.getint('process', 'silo_workers', fallback=1)
+        if max_workers > 1 and len(silos) > 1:
+            self._silo_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers)
+        # Find out in one go which entries were already posted to each
+        # silo.
+        self._posted_uris = {}
+        if not self.ctx.args.no_cache:
+            entry_urls = [e.get('url') for e in feed.entries]
+            entry_urls = [u for u in entry_urls if isinstance(u, str)]
+            for silo in silos:
+                with timing.labels(silo=silo.name), timed('cache_read'):
+                    self._posted_uris[silo.name] = \
+                        self.ctx.cache.getPostedUris(silo.name, entry_urls)
+
+        self._media_store = MediaStore(
+            self.config.getint('process', 'media_workers', fallback=1))
+        try:
+            for entry in feed.entries:
+                self.processEntry(silos, postctx, entry)
+        finally:
+            if self._silo_executor is not None:
+                self._silo_executor.shutdown()
+                self._silo_executor = None
+            self._media_store.close()
+            self._media_store = None
 
-        self.postProcess(ok_silos)
+        self.postProcess(silos)
+
+        # Remember this version of the feed so we can skip it next time if
+        # it hasn't changed. Don't do it if anything went wrong, because we
+        # want to retry failed entries.
+        if self.fetch_cache and not self.ctx.args.dry_run:
+            with timed('cache_write'), self.ctx.cache.batch():
+                if self._had_errors:
+                    self.fetch_cache.forget(self.url)
+                    self.fetch_cache.setDigest(self.name, None)
+                else:
+                    self.fetch_cache.set(feed.fetch_result)
+                    self.fetch_cache.setDigest(
+                        self.name, feed.fetch_result.digest)
 
     def preProcess(self):
         # Pre-parse the "since" and "until" dates/times.
@@ -54,21 +213,34 @@ class Processor:
         if self.ctx.args.until:
             self.ctx.args.until = dateparser.parse(self.ctx.args.until)
 
-        # Go over the silos needed for this command (i.e. potentially
-        # filtered by passing `-s`) and call their `onPostStart`.
-        ok_silos = []
-        for silo in self.silos:
-            try:
+        # Silos are only started (see `startSilo`) once we know there's
+        # something to post to them.
+        self._started_silos = {}
+        return self.silos
+
+    def startSilo(self, silo):
+        # Call `onPostStart` the first time we need a silo, since that's
+        # usually where it creates its client and logs in.
+        started = self._started_silos.get(silo.name)
+        if started is not None:
+            return started
+
+        try:
+            with timed('silo_start'):
                 silo.onPostStart(self.ctx)
-                ok_silos.append(silo)
-            except Exception as ex:
-                logger.error("Error during pre-process of silo '%s'" % silo.name)
-                logger.error(ex)
-        return ok_silos
+            started = True
+        except Exception as ex:
+            started = False
+            self._had_errors = True
+            logger.error("Error during pre-process of silo '%s'" % silo.name)
+            logger.error(ex)
+        self._started_silos[silo.name] = started
+        return started
 
     def postProcess(self, silos):
         for silo in silos:
-            silo.onPostEnd(self.ctx)
+            if self._started_silos.get(silo.name):
+                silo.onPostEnd(self.ctx)
 
     def processEntry(self, silos, postctx, entry):
         entry_url = entry.get('url')
@@ -80,70 +252,130 @@ class Processor:
             logger.debug("Entry is filtered out: %s" % entry_url)
             return
 
+        logger.debug("Processing entry: %s" % entry_url)
+        if self._silo_executor is None or len(silos) <= 1:
+            for silo in silos:
+                self.processEntryForSilo(silo, postctx, entry, entry_url)
+            return
+
+        # Post to all silos in parallel, and wait for all of them to be
+        # done before moving on to the next entry.
+        futures = dict([
+            (self._silo_executor.submit(
+                self.processEntryForSilo, silo, postctx, entry, entry_url),
+             silo)
+            for silo in silos])
+        for future in concurrent.futures.as_completed(futures):
+            silo = futures[future]
+            try:
+                future.result()
+            except Exception as ex:
+                # Posting failures were already counted in the metrics by
+                # `processEntryForSilo`.
+                self._had_errors = True
+                logger.error("Error processing entry for '%s': %s" %
+                             (silo.name, entry_url))
+                logger.error(ex)
+                if self.ctx.args.verbose:
+                    raise
+
+    def processEntryForSilo(self, silo, postctx, entry, entry_url):
+        with timing.labels(feed=self.name, silo=silo.name):
+            self._processEntryForSilo(silo, postctx, entry, entry_url)
+
+    def _processEntryForSilo(self, silo, postctx, entry, entry_url):
         no_cache = self.ctx.args.no_cache
         only_since = self.ctx.args.since
         only_until = self.ctx.args.until
 
-        logger.debug("Processing entry: %s" % entry_url)
-        for silo in silos:
-            if only_since or only_until:
-                entry_dt = entry.get('published')
-                if not entry_dt:
-                    logger.warning(
-                        "Skipping entry with no published date/time "
-                        "for %s: %s" % (silo.name, entry_url))
-                    continue
-
-                # Strip entry datetime's time-zone information if we
-                # don't have a time-zone info from the command line.
-                if ((only_since and not only_since.tzinfo) or
-                    (only_until and not only_until.tzinfo)):
-                    entry_dt = entry_dt.replace(tzinfo=None)
-
-                if only_since and entry_dt < only_since:
-                    logger.info(
-                        "Skipping entry older than specified date/time "
-                        "for %s: %s" % (silo.name, entry_url))
-                    continue
-                if only_until and entry_dt > only_until:
-                    logger.info(
-                        "Skipping entry newer than specified date/time "
-                        "for %s: %s" % (silo.name, entry_url))
-                    continue
-
-            if not no_cache and self.ctx.cache.wasPosted(silo.name, entry_url):
-                logger.debug("Skipping already posted entry on %s: %s" %
-                             (silo.name, entry_url))
-                continue
+        if only_since or only_until:
+            entry_dt = entry.get('published')
+            if not entry_dt:
+                logger.warning(
+                    "Skipping entry with no published date/time "
+                    "for %s: %s" % (silo.name, entry_url))
+                return
+
+            # Strip entry datetime's time-zone information if we
+            # don't have a time-zone info from the command line.
+            if ((only_since and not only_since.tzinfo) or
+                (only_until and not only_until.tzinfo)):
+                entry_dt = entry_dt.replace(tzinfo=None)
+
+            if only_since and entry_dt < only_since:
+                logger.info(
+                    "Skipping entry older than specified date/time "
+                    "for %s: %s" % (silo.name, entry_url))
+                return
+            if only_until and entry_dt > only_until:
+                logger.info(
+                    "Skipping entry newer than specified date/time "
+                    "for %s: %s" % (silo.name, entry_url))
+                return
 
+        if not no_cache and self._wasPosted(silo, entry_url):
+            logger.debug("Skipping already posted entry on %s: %s" %
+                         (silo.name, entry_url))
+            return
+
+        if not self.startSilo(silo):
+            logger.debug("Skipping entry for silo that failed to start "
+                         "%s: %s" % (silo.name, entry_url))
+            return
+
+        with timed('format'):
             entry_card = silo.getEntryCard(entry, postctx)
-            if not entry_card:
-                logger.error("Can't find any content to use for entry: %s" % entry_url)
-                continue
-
-            media_callback = silo.mediaCallback
-            max_size = getattr(silo, 'PHOTO_LIMIT', None)
-            if self.ctx.args.dry_run:
-                media_callback = silo.dryRunMediaCallback
-                max_size = None
-            media_ids = upload_silo_media(entry_card, 'photo', media_callback, max_size)
-
-            if not self.ctx.args.dry_run:
-                logger.debug("Posting to '%s': %s" % (silo.name, entry_url))
-                try:
+        if not entry_card:
+            logger.error("Can't find any content to use for entry: %s" % entry_url)
+            return
+
+        media_callback = silo.mediaCallback
+        max_size = getattr(silo, 'PHOTO_LIMIT', None)
+        if self.ctx.args.dry_run:
+            media_callback = silo.dryRunMediaCallback
+            max_size = None
+        media_ids = upload_silo_media(entry_card, 'photo', media_callback, max_size,
+                                      self._media_store)
+
+        if not self.ctx.args.dry_run:
+            logger.debug("Posting to '%s': %s" % (silo.name, entry_url))
+            try:
+                with timed('post'):
                     did_post = silo.postEntry(entry_card, media_ids, postctx)
-                except Exception as ex:
-                    did_post = False
-                    logger.error("Error posting: %s" % entry_url)
-                    logger.error(ex)
-                    if self.ctx.args.verbose:
-                        raise
-                if did_post is True or did_post is None:
+            except Exception as ex:
+                did_post = False
+                self._had_errors = True
+                metrics.post_failures.inc(feed=self.name, silo=silo.name)
+                logger.error("Error posting: %s" % entry_url)
+                logger.error(ex)
+                if self.ctx.args.verbose:
+                    raise
+            if did_post is True or did_post is None:
+                metrics.entries_posted.inc(feed=self.name, silo=silo.name)
+                with timed('cache_write'):
                     self.ctx.cache.addPost(silo.name, entry_url)
-            else:
-                logger.info("Would post to '%s': %s" % (silo.name, entry_url))
+                self._posted_uris.setdefault(silo.name, set()).add(entry_url)
+        else:
+            logger.info("Would post to '%s': %s" % (silo.name, entry_url))
+            with timed('post'):
                 silo.dryRunPostEntry(entry_card, media_ids, postctx)
 
+    def _wasPosted(self, silo, entry_url):
+        posted_uris = self._posted_uris.get(silo.name)
+        if posted_uris is not None:
+            return entry_url in posted_uris
+        return self.ctx.cache.wasPosted(silo.name, entry_url)
+
+    def getUrlsPostedEverywhere(self, entry_urls):
+        done_urls = set(entry_urls)
+        for silo in self.silos:
+            if not done_urls:
+                break
+            with timing.labels(silo=silo.name), timed('cache_read'):
+                done_urls = self.ctx.cache.getPostedUris(
+                    silo.name, done_urls)
+        return done_urls
+
     def isEntryFiltered(self, entry):
         if not self.config.has_section('filter'):
             return False
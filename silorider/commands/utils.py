@@ -1,6 +1,9 @@
 import logging
 import dateutil.parser
 from ..parse import parse_url
+from .. import metrics, timing
+from ..timing import timed
+from ..profiling import profile_feed
 
 
 logger = logging.getLogger(__name__)
@@ -42,9 +45,16 @@ def populate_cache(ctx):
         logger.debug("Populating cache until: %s" % until_dt)
         until_dt = until_dt.timestamp()
 
-    for name, url in named_urls:
-        logger.info("Caching entries from %s" % url)
-        _populate_cache_for_url(name, url, ctx, until_dt=until_dt)
+    has_metrics = metrics.setup(ctx.config)
+    try:
+        for name, url in named_urls:
+            logger.info("Caching entries from %s" % url)
+            with profile_feed(ctx, name), timing.labels(feed=name):
+                _populate_cache_for_url(name, url, ctx, until_dt=until_dt)
+    finally:
+        if has_metrics:
+            metrics.teardown()
+            metrics.export(ctx.config, 'populate')
 
 
 def _populate_cache_for_url(name, url, ctx, until_dt=None):
@@ -52,6 +62,7 @@ def _populate_cache_for_url(name, url, ctx, until_dt=None):
 
     feed = parse_url(url, name, ctx.config)
 
+    entries_and_urls = []
     for entry in feed.entries:
         entry_url = entry.get('url')
         if not entry_url:
@@ -60,7 +71,18 @@ def _populate_cache_for_url(name, url, ctx, until_dt=None):
 
         if isinstance(entry_url, list):
             entry_url = entry_url[0]
-
+        entries_and_urls.append((entry, entry_url))
+
+    # Find out in one go which entries are already in the cache.
+    entry_urls = [u for _, u in entries_and_urls]
+    posted_uris = {}
+    for silo in silos:
+        with timing.labels(silo=silo.name), timed('cache_read'):
+            posted_uris[silo.name] = ctx.cache.getPostedUris(
+                silo.name, entry_urls)
+
+    to_add = dict([(silo.name, []) for silo in silos])
+    for entry, entry_url in entries_and_urls:
         if until_dt:
             entry_published = entry.get('published')
             if not entry_published:
@@ -78,16 +100,25 @@ def _populate_cache_for_url(name, url, ctx, until_dt=None):
                 continue
 
         for silo in silos:
-            if ctx.cache.wasPosted(silo.name, entry_url):
+            if entry_url in posted_uris[silo.name]:
                 logger.debug("Entry is already in '%s' cache: %s" % (silo.name, entry_url))
                 continue
 
             if not ctx.args.dry_run:
                 logger.debug("Adding entry to '%s' cache: %s" % (silo.name, entry_url))
-                ctx.cache.addPost(silo.name, entry_url)
+                to_add[silo.name].append(entry_url)
+                posted_uris[silo.name].add(entry_url)
             else:
                 logger.debug("Would add entry to '%s' cache: %s" % (silo.name, entry_url))
 
+    # Write everything in one transaction.
+    with timed('cache_write'), ctx.cache.batch():
+        for silo_name, entry_urls in to_add.items():
+            if entry_urls:
+                ctx.cache.addPosts(silo_name, entry_urls)
+                metrics.entries_populated.inc(
+                    len(entry_urls), feed=name, silo=silo_name)
+
 
 def forget_cache(ctx):
     named_urls = get_named_urls(ctx.config, ctx.args.url)
@@ -0,0 +1,235 @@
+import os.path
+import shutil
+import hashlib
+import logging
+import threading
+import email.message
+import urllib.parse
+import urllib.request
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_TIMEOUT = 30
+DEFAULT_MAX_CONNECTIONS = 4
+USER_AGENT = 'SiloRider'
+
+_http_settings = {
+    'timeout': DEFAULT_TIMEOUT,
+    'max_connections': DEFAULT_MAX_CONNECTIONS,
+}
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def configure_http(config):
+    """ Applies the `[http]` configuration section to the shared HTTP
+        session.
+    """
+    global _http_session
+    with _http_session_lock:
+        _http_settings['timeout'] = config.getfloat(
+            'http', 'timeout', fallback=DEFAULT_TIMEOUT)
+        _http_settings['max_connections'] = config.getint(
+            'http', 'max_connections', fallback=DEFAULT_MAX_CONNECTIONS)
+        if _http_session is not None:
+            _http_session.close()
+            _http_session = None
+
+
+def get_http_session():
+    """ Returns the HTTP session shared by everything in SiloRider, so that
+        connections to the same host are kept alive and re-used.
+    """
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            _http_session = _create_http_session()
+        return _http_session
+
+
+def _create_http_session():
+    import requests
+    import requests.adapters
+
+    # Limit the number of connections to any given host, and have
+    # threads wait for a connection to be available instead of opening
+    # more.
+    max_connections = _http_settings['max_connections']
+    adapter = requests.adapters.HTTPAdapter(
+        pool_maxsize=max_connections, pool_block=True)
+
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    # Requests handles gzip and deflate, and brotli if it's installed.
+    session.headers['User-Agent'] = USER_AGENT
+    return session
+
+
+def http_get(url, *, headers=None, stream=False):
+    """ Makes a GET request with the shared HTTP session. The caller is
+        responsible for checking the status code, and for closing the
+        response if `stream` is set.
+    """
+    return get_http_session().get(
+        url, headers=headers, stream=stream,
+        timeout=_http_settings['timeout'])
+
+
+def download_file(url, path):
+    """ Downloads the given URL to the given path, and returns that path.
+    """
+    parsed = urllib.parse.urlparse(url)
+    if parsed.scheme == 'file':
+        shutil.copyfile(urllib.request.url2pathname(parsed.path), path)
+        return path
+
+    with http_get(url, stream=True) as resp:
+        resp.raise_for_status()
+        with open(path, 'wb') as fp:
+            for chunk in resp.iter_content(chunk_size=65536):
+                fp.write(chunk)
+    return path
+
+
+class FetchResult:
+    def __init__(self, url, body, *,
+                 etag=None, last_modified=None, charset=None,
+                 not_modified=False, size=0):
+        self.url = url
+        self.body = body
+        self.size = size
+        self.charset = charset
+        self.etag = etag
+        self.last_modified = last_modified
+        self.not_modified = not_modified
+
+    @property
+    def has_validators(self):
+        return bool(self.etag or self.last_modified)
+
+    @property
+    def digest(self):
+        body = self.body
+        if isinstance(body, str):
+            body = body.encode('utf8')
+        return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+class FetchCache:
+    """ Keeps the HTTP validators (ETag and Last-Modified headers) and the
+        raw body of fetched pages in the SiloRider cache, so we can make
+        conditional requests on the next run. Also keeps a digest of the
+        contents of each named feed, for servers that don't send validators.
+
+        If given a fingerprint of the configuration, anything stored with a
+        different fingerprint is ignored, so that a feed is processed again
+        after, say, a silo was added.
+    """
+    def __init__(self, cache, fingerprint=None):
+        self.cache = cache
+        self.fingerprint = fingerprint or ''
+
+    def get(self, url):
+        etag = self._getValue(url, 'etag')
+        last_modified = self._getValue(url, 'last_modified')
+        if not etag and not last_modified:
+            return None
+
+        if (self._getValue(url, 'fingerprint') or '') != self.fingerprint:
+            logger.debug("Configuration changed since last fetch: %s" % url)
+            return None
+
+        body = self._getValue(url, 'body')
+        if body is None:
+            return None
+
+        return FetchResult(url, body,
+                           etag=etag, last_modified=last_modified)
+
+    def set(self, result):
+        if not result.has_validators:
+            return
+
+        body = result.body
+        if isinstance(body, bytes):
+            body = body.decode(result.charset or 'utf8',
+                               errors='replace')
+
+        logger.debug("Caching fetched page: %s" % result.url)
+        self._setValue(result.url, 'etag', result.etag or '')
+        self._setValue(result.url, 'last_modified', result.last_modified or '')
+        self._setValue(result.url, 'body', body)
+        self._setValue(result.url, 'fingerprint', self.fingerprint)
+
+    def forget(self, url):
+        logger.debug("Forgetting cached page: %s" % url)
+        for key in ('etag', 'last_modified', 'body', 'fingerprint'):
+            self._setValue(url, key, '')
+
+    def getDigest(self, name):
+        val = self.cache.getCustomValue('fetch_digest:%s' % name)
+        if not val:
+            return None
+        # The digest is stored along with the configuration fingerprint.
+        fingerprint, _, digest = val.rpartition(':')
+        if fingerprint != self.fingerprint:
+            return None
+        return digest
+
+    def setDigest(self, name, digest):
+        val = '%s:%s' % (self.fingerprint, digest) if digest else ''
+        self.cache.setCustomValue('fetch_digest:%s' % name, val)
+
+    def _getValue(self, url, key):
+        val = self.cache.getCustomValue('fetch:%s:%s' % (url, key))
+        return val or None
+
+    def _setValue(self, url, key, val):
+        self.cache.setCustomValue('fetch:%s:%s' % (url, key), val)
+
+
+def fetch_url(url_or_path, cached=None):
+    """ Fetches the given URL or local file. If a previous `FetchResult` is
+        given, a conditional request is made and, if the server says the
+        page wasn't modified, the previous body is returned with the
+        `not_modified` flag set.
+    """
+    logger.debug("Fetching %s" % url_or_path)
+    if os.path.exists(url_or_path):
+        with open(url_or_path, 'r', encoding='utf8') as fp:
+            return FetchResult(url_or_path, fp.read(),
+                               size=os.path.getsize(url_or_path))
+
+    headers = {}
+    if cached is not None:
+        if cached.etag:
+            headers['If-None-Match'] = cached.etag
+        if cached.last_modified:
+            headers['If-Modified-Since'] = cached.last_modified
+
+    resp = http_get(url_or_path, headers=headers)
+    if resp.status_code != 304 or cached is None:
+        resp.raise_for_status()
+        body = resp.content
+        return FetchResult(
+            url_or_path, body,
+            etag=resp.headers.get('ETag'),
+            last_modified=resp.headers.get('Last-Modified'),
+            charset=get_content_charset(resp.headers),
+            size=len(body))
+
+    logger.debug("Page wasn't modified since last fetch: %s" % url_or_path)
+    return FetchResult(url_or_path, cached.body,
+                       etag=cached.etag, last_modified=cached.last_modified,
+                       not_modified=True)
+
+
+def get_content_charset(headers):
+    # Only return a charset if the server specified one, unlike what
+    # requests does with text content.
+    msg = email.message.Message()
+    msg['Content-Type'] = headers.get('Content-Type', '')
+    return msg.get_content_charset()
@@ -1,10 +1,10 @@
 import re
 import string
 import logging
-import urllib.request
 import textwrap
 import bs4
 from .config import has_lxml
+from .cardinfo import CardMetaCache
 
 
 logger = logging.getLogger(__name__)
@@ -14,7 +14,7 @@ _disable_get_card_info = False
 
 def format_entry(entry, *,
                  silo_name=None, silo_type=None,
-                 limit=None, card_props=None,
+                 limit=None, card_props=None, card_cache=None,
                  add_url='auto', url_flattener=None,
                  profile_url_handlers=None, url_mode=None):
     url = entry.url
@@ -34,7 +34,7 @@ def format_entry(entry, *,
 
     # See if we can use a nice blurb for articles instead of their title.
     if card_props and not entry.is_micropost and not _disable_get_card_info:
-         card = get_card_info(entry, card_props, ctx)
+         card = get_card_info(entry, card_props, ctx, card_cache)
 
     # Otherwise, find the best text, generally the title of the article, or the
     # text of the micropost.
@@ -233,20 +233,12 @@ def get_best_text(entry, ctx=None, *, plain=True):
     return None
 
 
-def get_card_info(entry, card_props, ctx):
-    logger.debug("Downloading entry page to check meta entries: %s" % entry.url)
-    with urllib.request.urlopen(entry.url) as req:
-        raw_html = req.read()
-
-    bs_html = bs4.BeautifulSoup(raw_html,
-            'lxml' if has_lxml else 'html5lib')
-    head = bs_html.find('head')
-
-    desc_meta = head.find('meta', attrs={card_props.meta_attr: card_props.description})
-    desc = desc_meta.attrs.get('content') if desc_meta else None
-
-    img_meta = head.find('meta', attrs={card_props.meta_attr: card_props.image})
-    img = img_meta.attrs.get('content') if img_meta else None
+def get_card_info(entry, card_props, ctx, card_cache=None):
+    if card_cache is None:
+        card_cache = CardMetaCache()
+    metas = card_cache.getPageMetas(entry.url).get(card_props.meta_attr, {})
+    desc = metas.get(card_props.description)
+    img = metas.get(card_props.image)
 
     if desc:
         logger.debug("Found card info, description: %s (image: %s)" % (desc, img))
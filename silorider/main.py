@@ -67,9 +67,45 @@ def _setup_process(parser):
         '--dry-run',
         action='store_true',
         help="Only report what would be posted, but don't post anything.")
+    parser.add_argument(
+        '--timings',
+        action='store_true',
+        help="Print how much time was spent in each processing stage.")
+    parser.add_argument(
+        '--timings-json',
+        help="Write how much time was spent in each processing stage, "
+             "as JSON, to the given file.")
     parser.set_defaults(func=_run)
 
 
+def _setup_daemon(parser):
+    def _run(ctx):
+        from .commands.daemon import run_daemon
+        run_daemon(ctx)
+
+    parser.add_argument(
+        '-u', '--url',
+        action='append',
+        help="Only poll the given URL name(s).")
+    parser.add_argument(
+        '-s', '--silo',
+        action='append',
+        help="Only use the given silo(s).")
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help="Only report what would be posted, but don't post anything.")
+    parser.add_argument(
+        '--max-polls',
+        type=int,
+        default=0,
+        help="Stop after polling feeds this many times in total.")
+    # The daemon checks the same posted URIs over and over, so keep them
+    # in memory.
+    parser.set_defaults(func=_run, no_cache=False, since=None, until=None,
+                        read_through_cache=True)
+
+
 def _setup_populate(parser):
     def _run(ctx):
         from .commands.utils import populate_cache
@@ -124,6 +160,10 @@ commands = {
         'help': "Post a website's latest articles to silo services.",
         'setup': _setup_process,
     },
+    'daemon': {
+        'help': "Keep running, and process feeds at regular intervals.",
+        'setup': _setup_daemon,
+    },
     'populate': {
         'help': "Populates the cache with the latest entries from a feed.",
         'setup': _setup_populate,
@@ -153,6 +193,15 @@ def _unsafe_main(args=None):
     parser.add_argument(
         '-c', '--config',
         help="Configuration file to load.")
+    parser.add_argument(
+        '--profile',
+        help=("Profile the command with cProfile, and write the stats to "
+              "the given file."))
+    parser.add_argument(
+        '--profile-split',
+        action='store_true',
+        help=("Write one profile per feed instead, next to the file "
+              "given to --profile."))
 
     subparsers = parser.add_subparsers()
     for cn, cd in commands.items():
@@ -207,10 +256,14 @@ def _unsafe_main(args=None):
                        "Nothing to do!")
         return
 
+    from .fetch import configure_http
+    configure_http(config)
+
     logger.debug("Initializing cache.")
     from .cache.base import load_cache
     cfg_dir = os.path.dirname(args.config) if args.config else None
-    cache = load_cache(config, cfg_dir)
+    cache = load_cache(config, cfg_dir,
+                       getattr(args, 'read_through_cache', False))
 
     logger.debug("Initializing silo riders.")
     from .silos.base import load_silos
@@ -221,7 +274,11 @@ def _unsafe_main(args=None):
     if pre_exec_hook:
         pre_exec_hook(ctx)
 
-    res = args.func(ctx)
+    if args.profile and not args.profile_split:
+        from .profiling import profile_call
+        res = profile_call(args.profile, args.func, ctx)
+    else:
+        res = args.func(ctx)
 
     if post_exec_hook:
         post_exec_hook(ctx, res)
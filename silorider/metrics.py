@@ -0,0 +1,286 @@
+import os
+import os.path
+import time
+import logging
+import tempfile
+import threading
+from . import timing
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Metric:
+    METRIC_TYPE = 'untyped'
+
+    def __init__(self, name, help_text, labelnames=None):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames or ())
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _getKey(self, labels):
+        if set(labels.keys()) != set(self.labelnames):
+            raise Exception("Metric '%s' needs labels %s, got %s" %
+                            (self.name, self.labelnames,
+                             tuple(labels.keys())))
+        return tuple([str(labels[n]) for n in self.labelnames])
+
+    def getValue(self, **labels):
+        with self._lock:
+            return self._values.get(self._getKey(labels))
+
+    def reset(self):
+        with self._lock:
+            self._values = {}
+
+    def formatText(self):
+        lines = ['# HELP %s %s' % (self.name, _escape_help(self.help_text)),
+                 '# TYPE %s %s' % (self.name, self.METRIC_TYPE)]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines += self._formatSamples(items)
+        return lines
+
+    def _formatSamples(self, items):
+        return [self._formatSample(self.name, key, value)
+                for key, value in items]
+
+    def _formatSample(self, name, key, value, extra_labels=None):
+        pairs = list(zip(self.labelnames, key))
+        if extra_labels:
+            pairs += extra_labels
+        if pairs:
+            name += '{%s}' % ','.join([
+                '%s="%s"' % (n, _escape_label_value(v)) for n, v in pairs])
+        return '%s %s' % (name, _format_value(value))
+
+
+class Counter(Metric):
+    METRIC_TYPE = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._getKey(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    METRIC_TYPE = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._getKey(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    METRIC_TYPE = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=None,
+                 buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._getKey(labels)
+        with self._lock:
+            hist = self._values.get(key)
+            if hist is None:
+                # Bucket counts (non-cumulative), sum, count.
+                hist = [[0] * len(self.buckets), 0.0, 0]
+                self._values[key] = hist
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    hist[0][i] += 1
+                    break
+            hist[1] += value
+            hist[2] += 1
+
+    def _formatSamples(self, items):
+        lines = []
+        for key, (bucket_counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                lines.append(self._formatSample(
+                    self.name + '_bucket', key, cumulative,
+                    [('le', _format_value(bound))]))
+            lines.append(self._formatSample(
+                self.name + '_bucket', key, count, [('le', '+Inf')]))
+            lines.append(self._formatSample(self.name + '_sum', key, total))
+            lines.append(self._formatSample(
+                self.name + '_count', key, count))
+        return lines
+
+
+def _escape_help(text):
+    return text.replace('\\', '\\\\').replace('\n', '\\n')
+
+
+def _escape_label_value(value):
+    return (value.replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        if value == int(value) and abs(value) < 1e15:
+            return '%d.0' % value
+        return repr(value)
+    return str(value)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs):
+        return self.add(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs):
+        return self.add(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs):
+        return self.add(Histogram(*args, **kwargs))
+
+    def reset(self):
+        for m in self._metrics:
+            m.reset()
+
+    def formatText(self):
+        lines = []
+        for m in self._metrics:
+            lines += m.formatText()
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+entries_seen = registry.counter(
+    'silorider_entries_seen_total',
+    "Number of entries found in feeds.",
+    ['feed'])
+entries_posted = registry.counter(
+    'silorider_entries_posted_total',
+    "Number of entries posted to silos.",
+    ['feed', 'silo'])
+post_failures = registry.counter(
+    'silorider_post_failures_total',
+    "Number of entries that failed to be posted to silos.",
+    ['feed', 'silo'])
+entries_populated = registry.counter(
+    'silorider_entries_populated_total',
+    "Number of entries added to the cache without being posted.",
+    ['feed', 'silo'])
+fetch_bytes = registry.counter(
+    'silorider_fetch_bytes_total',
+    "Number of bytes downloaded when fetching feeds.",
+    ['feed'])
+stage_duration = registry.histogram(
+    'silorider_stage_duration_seconds',
+    "Time spent in each processing stage, e.g. 'fetch', 'upload' or "
+    "'cache_read'.",
+    ['stage', 'feed', 'silo'])
+last_run = registry.gauge(
+    'silorider_last_run_timestamp_seconds',
+    "When a command last finished running.",
+    ['command'])
+
+
+class _StageDurationSink:
+    def record(self, stage, duration, feed=None, silo=None):
+        stage_duration.observe(duration, stage=stage,
+                               feed=feed or '', silo=silo or '')
+
+
+_stage_sink = _StageDurationSink()
+
+
+def is_enabled(config):
+    return bool(config.get('metrics', 'textfile', fallback=None) or
+                config.getint('metrics', 'http_port', fallback=0))
+
+
+def setup(config):
+    """ Starts collecting stage durations if metrics are configured.
+        Returns whether they are.
+    """
+    if not is_enabled(config):
+        return False
+    timing.add_sink(_stage_sink)
+    return True
+
+
+def teardown():
+    timing.remove_sink(_stage_sink)
+
+
+def export(config, command):
+    """ Writes the metrics to the configured textfile, if any.
+    """
+    last_run.set(time.time(), command=command)
+
+    path = config.get('metrics', 'textfile', fallback=None)
+    if path:
+        write_textfile(path)
+
+
+def write_textfile(path):
+    # Write to a temporary file and rename it, so that the node exporter
+    # never reads a half-written file.
+    logger.debug("Writing metrics to: %s" % path)
+    dirname = os.path.dirname(os.path.abspath(path))
+    tmpfd, tmppath = tempfile.mkstemp(dir=dirname, prefix='.silorider')
+    try:
+        with os.fdopen(tmpfd, 'w', encoding='utf8') as fp:
+            fp.write(registry.formatText())
+        os.chmod(tmppath, 0o644)
+        os.replace(tmppath, path)
+    except Exception:
+        os.remove(tmppath)
+        raise
+
+
+def start_http_server(config):
+    """ Serves the metrics over HTTP, on a background thread, if a port
+        is configured. Returns the server, or `None`.
+    """
+    port = config.getint('metrics', 'http_port', fallback=0)
+    if not port:
+        return None
+
+    import http.server
+
+    class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = registry.formatText().encode('utf8')
+            self.send_response(200)
+            self.send_header('Content-Type',
+                             'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, fmt, *args):
+            logger.debug(fmt % args)
+
+    address = config.get('metrics', 'http_address', fallback='127.0.0.1')
+    server = http.server.ThreadingHTTPServer((address, port), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    logger.info("Serving metrics on http://%s:%d/metrics" %
+                (address, server.server_address[1]))
+    return server
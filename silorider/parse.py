@@ -1,12 +1,13 @@
-import os.path
 import logging
 import configparser
-import urllib.request
 import bs4
 import mf2py
 import dateutil.parser
 from datetime import datetime, date, timezone, timedelta
 from .config import has_lxml
+from .fetch import fetch_url
+from .timing import timed
+from . import metrics
 
 
 logger = logging.getLogger(__name__)
@@ -21,18 +22,65 @@ def _get_entry_published_dt(entry):
     return dt
 
 
-def parse_url(url_or_path, name, config):
-    mf_obj = parse_mf2(url_or_path, name, config)
-    matcher = EntryMatcher(mf_obj.to_dict(), mf_obj.__doc__)
+def parse_url(url_or_path, name, config, *,
+              fetch_cache=None, skip_unchanged=False,
+              get_done_urls=None, stop_after_done=0):
+    """ Fetches and parses the given feed.
+
+        If `get_done_urls` is given, it will be called once with the URLs
+        of all entries and must return the set of those that don't need
+        processing. Those entries are skipped without being interpreted,
+        and, if `stop_after_done` is non-zero, parsing stops after that
+        many of them in a row, in document order (i.e. generally newest
+        first).
+    """
+    # Fetch the feed, making a conditional request if we have a previous
+    # version of it in the fetch cache.
+    cached = fetch_cache.get(url_or_path) if fetch_cache else None
+    with timed('fetch'):
+        fetched = fetch_url(url_or_path, cached)
+    metrics.fetch_bytes.inc(fetched.size, feed=name)
+    if skip_unchanged and _is_feed_unchanged(fetched, name, fetch_cache):
+        logger.debug("Feed wasn't modified, skipping parsing: %s" %
+                     url_or_path)
+        feed = Feed(url_or_path, None)
+        feed.fetch_result = fetched
+        feed.is_unchanged = True
+        return feed
+
+    mf_obj = parse_mf2_html(fetched.body, name, config)
+    with timed('entry_matching'):
+        matcher = EntryMatcher(mf_obj.to_dict(), mf_obj.__doc__)
+    metrics.entries_seen.inc(len(matcher.entries), feed=name)
 
     feed = Feed(url_or_path, matcher.mf_dict)
+    feed.fetch_result = fetched
+
+    done_urls = None
+    if get_done_urls is not None:
+        raw_urls = [_get_raw_entry_url(e) for e, _ in matcher.entries]
+        done_urls = get_done_urls([u for u in raw_urls if u])
 
     entries = []
+    done_run = 0
     for pair in matcher.entries:
         mf_entry, bs_el = pair
+
+        if done_urls is not None:
+            raw_url = _get_raw_entry_url(mf_entry)
+            if raw_url and raw_url in done_urls:
+                done_run += 1
+                if stop_after_done and done_run >= stop_after_done:
+                    logger.debug("Found %d done entries in a row, stopping." %
+                                 done_run)
+                    break
+                continue
+            done_run = 0
+
         try:
-            entry = Entry(feed, mf_entry, bs_el)
-            entry.interpret()
+            with timed('interpret'):
+                entry = Entry(feed, mf_entry, bs_el)
+                entry.interpret()
         except InvalidEntryException:
             logger.debug("Found invalid entry... skipping.")
             continue
@@ -49,27 +97,96 @@ def parse_url(url_or_path, name, config):
     return feed
 
 
+def _get_raw_entry_url(mf_entry):
+    # Get the entry's URL without interpreting it, the same way mf2util
+    # does it.
+    urls = mf_entry.get('properties', {}).get('url')
+    if not urls:
+        return None
+    url = urls[0] if isinstance(urls, list) else urls
+    if isinstance(url, dict):
+        url = url.get('value')
+    return url if isinstance(url, str) else None
+
+
+def _is_feed_unchanged(fetched, name, fetch_cache):
+    if fetched.not_modified:
+        return True
+    # Many servers don't send validators, so compare the contents with
+    # what we got last time.
+    if fetch_cache:
+        return fetch_cache.getDigest(name) == fetched.digest
+    return False
+
+
 def parse_mf2(url_or_path, name, config):
     # Get the URL or file contents.
-    logger.debug("Fetching %s" % url_or_path)
-    if os.path.exists(url_or_path):
-        with open(url_or_path, 'r', encoding='utf8') as fp:
-            html_raw = fp.read()
-    else:
-        with urllib.request.urlopen(url_or_path) as req:
-            html_raw = req.read()
+    fetched = fetch_url(url_or_path)
+    return parse_mf2_html(fetched.body, name, config)
+
+
+# The fastest HTML parser available for BeautifulSoup.
+fast_html_parser = 'lxml' if has_lxml else 'html.parser'
+
+
+def parse_mf2_html(html_raw, name, config):
+    mode = config.get('parse', 'mode', fallback='default')
+    if mode == 'single':
+        return _parse_mf2_html_single(html_raw, name, config)
+    if mode != 'default':
+        raise Exception("Unknown parse mode: %s" % mode)
+
+    # Without class rules, we don't need to patch the document, so if we
+    # have lxml, let mf2py build the tree itself. This is what it would
+    # end up using anyway, and it saves copying the embedded markup.
+    if has_lxml and not config.has_section('classes:%s' % name):
+        return _parse_mf2_html_unpatched(html_raw, 'lxml')
 
     # Load this into an HTML document and optionally patch it.
-    html_doc = bs4.BeautifulSoup(
-            html_raw,
-            'lxml' if has_lxml else 'html5lib')
-    _modify_html_doc(html_doc, name, config)
+    with timed('html_parse'):
+        html_doc = bs4.BeautifulSoup(
+                html_raw,
+                'lxml' if has_lxml else 'html5lib')
+    with timed('class_rewrite'):
+        _modify_html_doc(html_doc, name, config)
 
     # Parse the microformats!
-    return mf2py.Parser(
-            doc=html_doc,
-            html_parser='html5lib',
-            img_with_alt=True)
+    with timed('mf2_parse'):
+        return mf2py.Parser(
+                doc=html_doc,
+                html_parser='html5lib',
+                img_with_alt=True)
+
+
+def _parse_mf2_html_single(html_raw, name, config):
+    # Build only one document tree, with the fastest parser we have. If we
+    # don't need to patch the document, let mf2py build the tree itself:
+    # it then works on it in-place instead of making copies of the
+    # embedded markup.
+    #
+    # Note that when lxml is installed, this does the same work as the
+    # default mode: mf2py uses the builder of the tree it's given, which
+    # is lxml in both modes. It only makes a difference without lxml,
+    # where it uses Python's own parser instead of html5lib.
+    if not config.has_section('classes:%s' % name):
+        return _parse_mf2_html_unpatched(html_raw, fast_html_parser)
+
+    with timed('html_parse'):
+        html_doc = bs4.BeautifulSoup(html_raw, fast_html_parser)
+    with timed('class_rewrite'):
+        _modify_html_doc(html_doc, name, config)
+    with timed('mf2_parse'):
+        return mf2py.Parser(
+                doc=html_doc,
+                img_with_alt=True)
+
+
+def _parse_mf2_html_unpatched(html_raw, html_parser):
+    with timed('mf2_parse'):
+        return mf2py.Parser(
+                doc=html_raw,
+                html_parser=html_parser,
+                img_with_alt=True)
 
 
 def _modify_html_doc(doc, name, config):
@@ -125,6 +242,8 @@ class Feed:
         self.url = url
         self._mf_dict = mf_dict
         self.entries = []
+        self.fetch_result = None
+        self.is_unchanged = False
 
 
 class Entry:
@@ -219,9 +338,7 @@ class EntryMatcher:
         self.mf_dict = mf_dict
         self.entries = []
 
-        els_by_type = {}
-        next_el = {}
-
+        feed_children = []
         items = mf_dict.get('items', [])
         for item in items:
             item_types = item.get('type', [])
@@ -234,31 +351,52 @@ class EntryMatcher:
                 e_types = e.get('type')
                 if not e_types:
                     continue
-
-                # We only look at the first type on any element.
-                entry_type = e_types[0]
-
-                # Get the list of all elements of that type from the doc.
-                if entry_type not in els_by_type:
-                    ebt = list(bf_doc.find_all(class_=entry_type))
-                    els_by_type[entry_type] = ebt
-                    next_el[entry_type] = 0
-                    if len(ebt) == 0:
-                        logger.warning("Found no elements of type: %s" % entry_type)
-
-                # We figure that mf2py found elements in the same order as
-                # they are found in the document, so we associate the two
-                # in order.
-                els = els_by_type[entry_type]
-                try:
-                    e_and_el = (e, els[next_el[entry_type]])
-                    self.entries.append(e_and_el)
-                except IndexError:
-                    logger.error(
-                            "Ran out of elements in document! Found %d elements "
-                            "of type '%s' but was trying to get element %d" %
-                            (len(els), str(e_types), next_el[entry_type]))
-                next_el[entry_type] += 1
+                feed_children.append(e)
+
+        # Get the list of all elements of the types we need from the doc.
+        # We only look at the first type on any element.
+        entry_types = set([e['type'][0] for e in feed_children])
+        els_by_type = _find_all_by_class(bf_doc, entry_types)
+        for entry_type, els in els_by_type.items():
+            if len(els) == 0:
+                logger.warning("Found no elements of type: %s" % entry_type)
+
+        next_el = dict([(t, 0) for t in entry_types])
+        for e in feed_children:
+            e_types = e['type']
+            entry_type = e_types[0]
+
+            # We figure that mf2py found elements in the same order as
+            # they are found in the document, so we associate the two
+            # in order.
+            els = els_by_type[entry_type]
+            try:
+                e_and_el = (e, els[next_el[entry_type]])
+                self.entries.append(e_and_el)
+            except IndexError:
+                logger.error(
+                        "Ran out of elements in document! Found %d elements "
+                        "of type '%s' but was trying to get element %d" %
+                        (len(els), str(e_types), next_el[entry_type]))
+            next_el[entry_type] += 1
+
+
+def _find_all_by_class(bf_doc, class_names):
+    # Equivalent to calling `find_all(class_=...)` for each class name, but
+    # with only one pass over the document.
+    els_by_class = dict([(cn, []) for cn in class_names])
+    if not els_by_class:
+        return els_by_class
+
+    for el in bf_doc.find_all(class_=True):
+        el_classes = el.get('class', [])
+        if isinstance(el_classes, str):
+            el_classes = el_classes.split()
+        for cn in set(el_classes):
+            els = els_by_class.get(cn)
+            if els is not None:
+                els.append(el)
+    return els_by_class
 
 
 def strip_img_alt(photos):
@@ -0,0 +1,67 @@
+import os.path
+import logging
+import threading
+import contextlib
+
+
+logger = logging.getLogger(__name__)
+
+
+_feed_profilers = {}
+_feed_profilers_lock = threading.Lock()
+
+
+def profile_call(path, func, *args, **kwargs):
+    """ Runs the given function under cProfile, and writes the stats to
+        the given path.
+    """
+    import cProfile
+
+    logger.debug("Profiling command to: %s" % path)
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        _dump_stats(profiler, path)
+
+
+def is_splitting_feeds(ctx):
+    return bool(getattr(ctx.args, 'profile', None) and
+                getattr(ctx.args, 'profile_split', False))
+
+
+def get_feed_profile_path(path, feed_name):
+    root, ext = os.path.splitext(path)
+    return '%s.%s%s' % (root, feed_name, ext or '.prof')
+
+
+@contextlib.contextmanager
+def profile_feed(ctx, feed_name):
+    """ Profiles the work done for the given feed, if we're asked to make
+        one profile per feed. Successive profiles of the same feed (e.g.
+        when running as a daemon) are accumulated in the same file.
+    """
+    if not is_splitting_feeds(ctx):
+        yield
+        return
+
+    import cProfile
+
+    with _feed_profilers_lock:
+        profiler = _feed_profilers.get(feed_name)
+        if profiler is None:
+            profiler = cProfile.Profile()
+            _feed_profilers[feed_name] = profiler
+
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        _dump_stats(profiler,
+                    get_feed_profile_path(ctx.args.profile, feed_name))
+
+
+def _dump_stats(profiler, path):
+    logger.debug("Writing profile: %s" % path)
+    profiler.dump_stats(path)
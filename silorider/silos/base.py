@@ -1,12 +1,18 @@
+import io
 import os
 import os.path
+import math
 import uuid
-import urllib.request
+import hashlib
 import logging
 import tempfile
+import importlib
+import threading
 import mimetypes
-from PIL import Image
+import concurrent.futures
+from .. import fetch
 from ..format import format_entry
+from ..timing import timed, bind_labels
 
 
 logger = logging.getLogger(__name__)
@@ -45,9 +51,10 @@ class SiloAuthenticationContext(SiloContextBase):
 
 
 class SiloPostingContext(SiloContextBase):
-    def __init__(self, exec_ctx, profile_url_handlers=None):
+    def __init__(self, exec_ctx, profile_url_handlers=None, card_cache=None):
         SiloContextBase.__init__(self, exec_ctx)
         self.profile_url_handlers = profile_url_handlers
+        self.card_cache = card_cache
 
 
 class SiloProfileUrlHandler:
@@ -125,22 +132,28 @@ def has_any_silo(config):
     return bool(_get_silo_section_names(config))
 
 
-def load_silos(config, cache):
-    from .print import PrintSilo
-    from .bluesky import BlueskySilo
-    from .facebook import FacebookSilo
-    from .mastodon import MastodonSilo
-    from .twitter import TwitterSilo
-    from .webmention import WebmentionSilo
-    silo_types = [
-        PrintSilo,
-        BlueskySilo,
-        FacebookSilo,
-        MastodonSilo,
-        TwitterSilo,
-        WebmentionSilo]
-    silo_dict = dict([(s.SILO_TYPE, s) for s in silo_types])
+# Silo modules import their (often heavy) client libraries, so we only
+# import those for the silo types that are actually used.
+silo_types = {
+    'print': ('.print', 'PrintSilo'),
+    'bluesky': ('.bluesky', 'BlueskySilo'),
+    'facebook': ('.facebook', 'FacebookSilo'),
+    'mastodon': ('.mastodon', 'MastodonSilo'),
+    'twitter': ('.twitter', 'TwitterSilo'),
+    'webmention': ('.webmention', 'WebmentionSilo'),
+}
+
 
+def get_silo_class(silo_type):
+    try:
+        mod_name, class_name = silo_types[silo_type]
+    except KeyError:
+        return None
+    mod = importlib.import_module(mod_name, __package__)
+    return getattr(mod, class_name)
+
+
+def load_silos(config, cache):
     silos = []
     sec_names = _get_silo_section_names(config)
     for sec_name in sec_names:
@@ -150,7 +163,7 @@ def load_silos(config, cache):
         if not silo_type:
             raise Exception("No silo type specified for: %s" % silo_name)
 
-        silo_class = silo_dict.get(silo_type)
+        silo_class = get_silo_class(silo_type)
         if not silo_class:
             raise Exception("Unknown silo type: %s" % silo_type)
 
@@ -161,83 +174,193 @@ def load_silos(config, cache):
     return silos
 
 
-def upload_silo_media(card, propname, callback, max_size=None):
+class MediaStore:
+    """ Downloads media files to a temporary directory, only once per URL,
+        so that the same local file can be uploaded to several silos.
+        Images that need to be made smaller for a silo are also resized
+        only once per size limit.
+    """
+    def __init__(self, max_workers=1):
+        self.max_workers = max_workers
+        self._tmpdir = tempfile.TemporaryDirectory(prefix='SiloRider')
+        self._paths = {}
+        self._digests = {}
+        self._resized = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def getFile(self, url, max_size=None):
+        with self._getKeyLock(url):
+            path = self._paths.get(url)
+            if path is None:
+                with timed('media_download'):
+                    path = _download_media(self._tmpdir.name, url)
+                self._paths[url] = path
+            else:
+                logger.debug("Re-using downloaded file for: %s" % url)
+
+        if max_size is None or os.path.getsize(path) <= max_size:
+            return path
+        return self._getResizedFile(path, max_size)
+
+    def _getResizedFile(self, path, max_size):
+        with self._getKeyLock(path):
+            digest = self._digests.get(path)
+            if digest is None:
+                digest = _get_file_digest(path)
+                self._digests[path] = digest
+
+        key = (digest, max_size)
+        with self._getKeyLock(key):
+            resized_path = self._resized.get(key)
+            if resized_path is None:
+                with timed('resize'):
+                    resized_path = _resize_image_to_fit(path, max_size)
+                self._resized[key] = resized_path
+            else:
+                logger.debug("Re-using resized image for: %s" % path)
+            return resized_path
+
+    def _getKeyLock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def prefetch(self, urls):
+        urls = [u for u in urls if u not in self._paths]
+        if self.max_workers <= 1 or len(urls) <= 1:
+            return
+
+        logger.debug("Downloading %d media files in parallel" % len(urls))
+        with concurrent.futures.ThreadPoolExecutor(self.max_workers) as executor:
+            get_file = bind_labels(self.getFile)
+            futures = [executor.submit(get_file, u) for u in urls]
+            for future in futures:
+                try:
+                    future.result()
+                except Exception as ex:
+                    # We'll get the error again when we actually need
+                    # the file.
+                    logger.debug("Error downloading media: %s" % ex)
+
+    def close(self):
+        logger.debug("Cleaning up.")
+        self._tmpdir.cleanup()
+
+
+def upload_silo_media(card, propname, callback, max_size=None,
+                      media_store=None):
     # The provided callback must take the parameters:
     #  tmpfile path, mimetype, original media url, media description
-    with tempfile.TemporaryDirectory(prefix='SiloRider') as tmpdir:
-
-        # Upload and use forced image, if any.
-        if card.image:
-            mid = _do_upload_silo_media(tmpdir, card.image, None, callback, max_size)
+    if media_store is None:
+        with MediaStore() as tmp_store:
+            return upload_silo_media(card, propname, callback, max_size,
+                                     tmp_store)
+
+    # Upload and use forced image, if any.
+    if card.image:
+        mid = _do_upload_silo_media(media_store, card.image, None, callback, max_size)
+        if mid is not None:
+            return [mid]
+
+    # Look for media in the body of the original post.
+    media_ids = None
+    media_entries = card.entry.get(propname, [], force_list=True)
+    if media_entries:
+        media_ids = []
+        urls_and_descs = [_img_url_and_alt(me) for me in media_entries]
+        media_store.prefetch([u for u, _ in urls_and_descs])
+        for url, desc in urls_and_descs:
+            mid = _do_upload_silo_media(media_store, url, desc, callback, max_size)
             if mid is not None:
-                return [mid]
-
-        # Look for media in the body of the original post.
-        media_ids = None
-        media_entries = card.entry.get(propname, [], force_list=True)
-        if media_entries:
-            media_ids = []
-            for media_entry in media_entries:
-                url, desc = _img_url_and_alt(media_entry)
-                mid = _do_upload_silo_media(tmpdir, url, desc, callback, max_size)
-                if mid is not None:
-                    media_ids.append(mid)
+                media_ids.append(mid)
 
     return media_ids
 
 
-def _do_upload_silo_media(tmpdir, url, desc, callback, max_size=None):
-    logger.debug("Downloading %s for upload to silo..." % url)
+def _do_upload_silo_media(media_store, url, desc, callback, max_size=None):
+    mt = _guess_media_type(url)
+    tmpfile = media_store.getFile(url, max_size)
+    with timed('upload'):
+        return callback(tmpfile, mt, url, desc)
+
+
+def _guess_media_type(url):
     mt, enc = mimetypes.guess_type(url, strict=False)
     if not mt:
         logger.debug("Can't guess MIME type, defaulting to jpg")
         mt = mimetypes.common_types['.jpg']
+    return mt
+
 
+def _download_media(tmpdir, url):
+    logger.debug("Downloading %s for upload to silo..." % url)
+    mt = _guess_media_type(url)
     ext = mimetypes.guess_extension(mt) or '.jpg'
     logger.debug("Got MIME type and extension: %s %s" % (mt, ext))
 
-    try:
-        tmpfile = os.path.join(tmpdir, str(uuid.uuid4()) + ext)
-        logger.debug("Downloading photo to temporary file: %s" % tmpfile)
-        tmpfile, headers = urllib.request.urlretrieve(url, filename=tmpfile)
-        tmpfile = _ensure_file_not_too_large(tmpfile, max_size)
-        return callback(tmpfile, mt, url, desc)
-    finally:
-        logger.debug("Cleaning up.")
-        urllib.request.urlcleanup()
+    tmpfile = os.path.join(tmpdir, str(uuid.uuid4()) + ext)
+    logger.debug("Downloading photo to temporary file: %s" % tmpfile)
+    return fetch.download_file(url, tmpfile)
 
 
-def _ensure_file_not_too_large(path, max_size):
-    if max_size is None:
-        return path
+def _get_file_digest(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(65536), b''):
+            h.update(chunk)
+    return h.hexdigest()
 
-    file_size = os.path.getsize(path)
-    if file_size <= max_size:
-        return path
 
-    loops = 0
-    scale = 0.75
-    path_no_ext, ext = os.path.splitext(path)
-    smaller_path = '%s_bsky%s' % (path_no_ext, ext)
+def _resize_image_to_fit(path, max_size, max_loops=8):
+    # PIL takes a while to import, and we rarely need it.
+    from PIL import Image
+
+    file_size = os.path.getsize(path)
     with Image.open(path) as orig_im:
-        # Resize down 75% until we get below the size limit.
-        img_width, img_height = orig_im.size
-        while loops < 10:
+        img_format = orig_im.format or 'JPEG'
+        orig_width, orig_height = orig_im.size
+        orig_im.load()
+
+        # The encoded size of an image is roughly proportional to its area,
+        # so start with a good guess and then bisect the scale factor,
+        # encoding in memory, until we find a scale that fits well enough.
+        lo, hi = 0.0, 1.0
+        scale = min(0.95, 0.95 * math.sqrt(max_size / file_size))
+        best_data = None
+        for _ in range(max_loops):
+            img_width = max(1, int(orig_width * scale))
+            img_height = max(1, int(orig_height * scale))
             logger.debug("Resizing '%s' by a factor of %f" % (path, scale))
-            img_width = int(img_width * scale)
-            img_height = int(img_height * scale)
             with orig_im.resize((img_width, img_height)) as smaller_im:
-                smaller_im.save(smaller_path)
+                buf = io.BytesIO()
+                smaller_im.save(buf, format=img_format)
+
+            data_size = buf.tell()
+            logger.debug("Now got size %d (max size %d)" % (data_size, max_size))
+            if data_size <= max_size:
+                lo = scale
+                best_data = buf
+                # Good enough, no need to get any closer to the limit.
+                if data_size >= max_size * 0.9:
+                    break
+            else:
+                hi = scale
+            scale = (lo + hi) / 2.0
+
+    if best_data is None:
+        raise Exception("Can't reach a small enough image to upload!")
 
-            file_size = os.path.getsize(smaller_path)
-            logger.debug("Now got file size %d (max size %d)" % (file_size, max_size))
-            if file_size <= max_size:
-                return smaller_path
-
-            scale = scale * scale
-            loops += 1
-
-    raise Exception("Can't reach a small enough image to upload!")
+    path_no_ext, ext = os.path.splitext(path)
+    smaller_path = '%s_%d%s' % (path_no_ext, max_size, ext)
+    with open(smaller_path, 'wb') as fp:
+        fp.write(best_data.getbuffer())
+    return smaller_path
 
 
 def _img_url_and_alt(media_entry):
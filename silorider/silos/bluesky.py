@@ -59,6 +59,8 @@ class BlueskySilo(Silo):
 
         base_url = self.getConfigItem('url')
         self.client = self._CLIENT_CLASS(base_url)
+        self._logged_in_as = None
+        self._session_string = None
 
     def authenticate(self, ctx):
         force = ctx.exec_ctx.args.force
@@ -75,6 +77,7 @@ class BlueskySilo(Silo):
 
             logger.info("Authenticated as %s" % profile.display_name)
             self.setCacheItem('password', password)
+            self._saveSession()
 
     def onPostStart(self, ctx):
         if not ctx.args.dry_run:
@@ -83,7 +86,51 @@ class BlueskySilo(Silo):
             if not email or not password:
                 raise Exception("Please authenticate Bluesky silo %s" %
                                 self.ctx.silo_name)
-            self.client.login(email, password)
+            # When running as a daemon, we keep the same client around,
+            # and it refreshes its session by itself.
+            if self._logged_in_as == email:
+                return
+            if not self._resumeSession():
+                logger.debug("Logging into Bluesky for %s" % self.name)
+                self.client.login(email, password)
+                self._saveSession()
+            self._logged_in_as = email
+
+    def onPostEnd(self, ctx):
+        # The client may have refreshed its session while posting.
+        if self._logged_in_as:
+            self._saveSession()
+
+    def _resumeSession(self):
+        # Re-use the session from last time, if any, instead of creating
+        # a new one, since that is rate-limited. The client refreshes it
+        # if it has expired.
+        session_string = self.getCacheItem('session')
+        if not session_string or not self._canExportSession():
+            return False
+
+        try:
+            self.client.login(session_string=session_string)
+        except Exception as ex:
+            logger.debug("Can't resume Bluesky session for %s: %s" %
+                         (self.name, ex))
+            return False
+
+        logger.debug("Resumed Bluesky session for %s" % self.name)
+        self._session_string = session_string
+        self._saveSession()
+        return True
+
+    def _saveSession(self):
+        if not self._canExportSession():
+            return
+        session_string = self.client.export_session_string()
+        if session_string and session_string != self._session_string:
+            self.setCacheItem('session', session_string)
+            self._session_string = session_string
+
+    def _canExportSession(self):
+        return hasattr(self.client, 'export_session_string')
 
     def getEntryCard(self, entry, ctx):
         # We use URLMODE_ERASE to remove all hyperlinks from the
@@ -95,6 +142,7 @@ class BlueskySilo(Silo):
             limit=300,
             # Use Twitter's meta properties
             card_props=CardProps('name', 'twitter'),
+            card_cache=ctx.card_cache,
             profile_url_handlers=ctx.profile_url_handlers,
             url_flattener=url_flattener,
             url_mode=URLMODE_ERASE)
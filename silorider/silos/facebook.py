@@ -140,6 +140,7 @@ class FacebookSilo(Silo):
         return self.formatEntry(
                 entry,
                 card_props=CardProps('property', 'og'),
+                card_cache=ctx.card_cache,
                 profile_url_handlers=ctx.profile_url_handlers)
 
     def mediaCallback(self, tmpfile, mt, url, desc):
@@ -119,7 +119,8 @@ class MastodonSilo(Silo):
         return self.formatEntry(
                 entry, limit=500,
                 # Use Twitter's meta properties
-                card_props=CardProps('name', 'twitter'))
+                card_props=CardProps('name', 'twitter'),
+                card_cache=ctx.card_cache)
 
     def mediaCallback(self, tmpfile, mt, url, desc):
         with open(tmpfile, 'rb') as tmpfp:
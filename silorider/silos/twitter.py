@@ -108,6 +108,7 @@ class TwitterSilo(Silo):
                 entry,
                 limit=280,
                 card_props=CardProps('name', 'twitter'),
+                card_cache=ctx.card_cache,
                 profile_url_handlers=ctx.profile_url_handlers,
                 url_flattener=TwitterUrlFlattener())
 
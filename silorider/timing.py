@@ -0,0 +1,217 @@
+import json
+import time
+import logging
+import threading
+import contextlib
+import functools
+
+
+logger = logging.getLogger(__name__)
+
+
+# The order in which stages are reported.
+STAGES = [
+    'fetch',
+    'html_parse',
+    'class_rewrite',
+    'mf2_parse',
+    'entry_matching',
+    'interpret',
+    'cache_read',
+    'silo_start',
+    'format',
+    'media_download',
+    'resize',
+    'upload',
+    'post',
+    'cache_write',
+]
+
+_recorder = None
+_sinks = []
+_sinks_lock = threading.Lock()
+_local = threading.local()
+
+
+class TimingRecorder:
+    """ Records the wall time spent in each processing stage, per feed and
+        per silo. This can be used from several threads at once.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timings = {}
+        self._start_time = time.perf_counter()
+        self._end_time = None
+
+    def record(self, stage, duration, feed=None, silo=None):
+        key = (feed, silo, stage)
+        with self._lock:
+            timing = self._timings.get(key)
+            if timing is None:
+                self._timings[key] = [1, duration]
+            else:
+                timing[0] += 1
+                timing[1] += duration
+
+    def stop(self):
+        self._end_time = time.perf_counter()
+
+    @property
+    def wall_time(self):
+        end_time = self._end_time or time.perf_counter()
+        return end_time - self._start_time
+
+    def getTimings(self):
+        with self._lock:
+            items = list(self._timings.items())
+        items.sort(key=_get_sort_key)
+        return [{'feed': feed, 'silo': silo, 'stage': stage,
+                 'count': count, 'total': total}
+                for (feed, silo, stage), (count, total) in items]
+
+    def getStageTotals(self):
+        totals = {}
+        for t in self.getTimings():
+            stage_total = totals.setdefault(t['stage'], [0, 0.0])
+            stage_total[0] += t['count']
+            stage_total[1] += t['total']
+        return [{'stage': s, 'count': c, 'total': tt}
+                for s, (c, tt) in sorted(
+                    totals.items(), key=lambda i: _get_stage_index(i[0]))]
+
+    def toDict(self):
+        return {
+            'wall_time': self.wall_time,
+            'stages': self.getStageTotals(),
+            'timings': self.getTimings()}
+
+    def toJson(self):
+        return json.dumps(self.toDict(), indent=2)
+
+    def formatTable(self):
+        lines = []
+        fmt = '%-16s %-16s %-16s %7s %11s %11s'
+        lines.append(fmt % ('Feed', 'Silo', 'Stage', 'Count',
+                            'Total (ms)', 'Mean (ms)'))
+        for t in self.getTimings():
+            lines.append(fmt % (
+                t['feed'] or '-', t['silo'] or '-', t['stage'], t['count'],
+                '%.2f' % (t['total'] * 1000),
+                '%.2f' % (t['total'] * 1000 / t['count'])))
+        lines.append('')
+        for t in self.getStageTotals():
+            lines.append(fmt % (
+                '*', '*', t['stage'], t['count'],
+                '%.2f' % (t['total'] * 1000),
+                '%.2f' % (t['total'] * 1000 / t['count'])))
+        lines.append('Total wall time: %.2fms' % (self.wall_time * 1000))
+        return '\n'.join(lines)
+
+
+def _get_stage_index(stage):
+    try:
+        return STAGES.index(stage)
+    except ValueError:
+        return len(STAGES)
+
+
+def _get_sort_key(item):
+    (feed, silo, stage), _ = item
+    return (feed or '', silo or '', _get_stage_index(stage), stage)
+
+
+def enable():
+    """ Starts recording timings, and returns the recorder.
+    """
+    global _recorder
+    disable()
+    _recorder = TimingRecorder()
+    add_sink(_recorder)
+    return _recorder
+
+
+def disable():
+    """ Stops recording timings, and returns the recorder, if any.
+    """
+    global _recorder
+    recorder = _recorder
+    _recorder = None
+    if recorder is not None:
+        remove_sink(recorder)
+        recorder.stop()
+    return recorder
+
+
+def add_sink(sink):
+    """ Adds an object whose `record(stage, duration, feed, silo)` method
+        will be called for every timed stage.
+    """
+    global _sinks
+    with _sinks_lock:
+        if sink not in _sinks:
+            _sinks = _sinks + [sink]
+
+
+def remove_sink(sink):
+    global _sinks
+    with _sinks_lock:
+        _sinks = [s for s in _sinks if s is not sink]
+
+
+def get_recorder():
+    return _recorder
+
+
+def get_labels():
+    return getattr(_local, 'labels', {})
+
+
+@contextlib.contextmanager
+def labels(**kwargs):
+    """ Sets the feed and/or silo that timings recorded on this thread
+        should be attributed to.
+    """
+    prev_labels = get_labels()
+    new_labels = dict(prev_labels)
+    new_labels.update(kwargs)
+    _local.labels = new_labels
+    try:
+        yield
+    finally:
+        _local.labels = prev_labels
+
+
+def bind_labels(func):
+    """ Returns a version of the given function that runs with the
+        current thread's labels, for when it will run on another thread.
+    """
+    cur_labels = get_labels()
+
+    @functools.wraps(func)
+    def _wrapper(*args, **kwargs):
+        with labels(**cur_labels):
+            return func(*args, **kwargs)
+
+    return _wrapper
+
+
+@contextlib.contextmanager
+def timed(stage):
+    """ Records the time spent in the given stage, if timings are being
+        recorded.
+    """
+    sinks = _sinks
+    if not sinks:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        cur_labels = get_labels()
+        for sink in sinks:
+            sink.record(stage, duration,
+                        feed=cur_labels.get('feed'),
+                        silo=cur_labels.get('silo'))
@@ -153,6 +153,14 @@ uri=memory://for_test
         return main_ctx, main_res
 
 
+@pytest.fixture(scope='session')
+def mastmock():
+    from silorider.silos.mastodon import MastodonSilo
+    from .mockutil import MastodonMock, MastodonMockUtil
+    MastodonSilo._CLIENT_CLASS = MastodonMock
+    return MastodonMockUtil()
+
+
 @pytest.fixture
 def feedutil():
     return FeedUtil()
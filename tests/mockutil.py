@@ -1,14 +1,73 @@
 
 def mock_urllib(m):
-    import urllib.request
-    m.setattr(urllib.request, 'urlretrieve', _patched_urlretrieve)
-    m.setattr(urllib.request, 'urlcleanup', _patched_urlcleanup)
+    import silorider.fetch
+    m.setattr(silorider.fetch, 'download_file', _patched_download_file)
     return m
 
 
-def _patched_urlretrieve(url, filename=None):
-    return ('/retrieved/' + url.lstrip('/'), None)
+def _patched_download_file(url, path):
+    return '/retrieved/' + url.lstrip('/')
 
 
-def _patched_urlcleanup():
-    pass
+class MockResponse:
+    """ A fake `requests` response.
+    """
+    def __init__(self, status_code, content=b'', headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+        self.chunks_read = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise Exception("HTTP error %d" % self.status_code)
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.content), chunk_size):
+            self.chunks_read += 1
+            yield self.content[i:i + chunk_size]
+
+
+class MastodonMock:
+    @staticmethod
+    def create_app(app_name, scopes, api_base_url):
+        return ('TEST_CLIENT_ID', 'TEST_CLIENT_SECRET')
+
+    def __init__(self, client_id, client_secret, access_token, api_base_url):
+        self.toots = []
+        self.media = []
+        self.next_mid = 1
+
+    def log_in(self, username, password, scopes):
+        return 'TEST_ACCESS_TOKEN'
+
+    def auth_request_url(self, scopes):
+        return 'https://example.org/auth'
+
+    def status_post(self, toot, media_ids=None, visibility=None):
+        self.toots.append((toot, media_ids, visibility))
+
+    def media_post(self, filename, mimetype):
+        mid = self.next_mid
+        self.next_mid += 1
+        self.media.append((filename, mimetype, mid))
+        return mid
+
+
+class MastodonMockUtil:
+    def installTokens(self, cli, silo_name):
+        def do_install_tokens(ctx):
+            ctx.cache.setCustomValue(
+                '%s_clienttoken' % silo_name,
+                'TEST_CLIENT_ID,TEST_CLIENT_SECRET')
+            ctx.cache.setCustomValue(
+                '%s_accesstoken' % silo_name,
+                'TEST_ACCESS_TOKEN')
+
+        cli.preExecHook(do_install_tokens)
@@ -0,0 +1,219 @@
+import pytest
+from silorider.cache.base import NullCache
+from silorider.cache.memory import MemoryCache
+from silorider.cache.readthrough import ReadThroughCache
+from silorider.cache.sqlite import SqliteCache
+from silorider.cache.urikeys import UriKeySet
+
+
+@pytest.fixture(params=['memory', 'memory_compact', 'sqlite',
+                        'readthrough', 'readthrough_compact'])
+def cache(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryCache()
+    if request.param == 'memory_compact':
+        return MemoryCache(compact=True)
+    sqlite_cache = SqliteCache(str(tmp_path / 'silorider.db'), None)
+    if request.param == 'readthrough':
+        return ReadThroughCache(sqlite_cache)
+    if request.param == 'readthrough_compact':
+        return ReadThroughCache(sqlite_cache, compact=True)
+    return sqlite_cache
+
+
+def test_posted_uris(cache):
+    cache.addPost('silo1', '/01.html')
+    cache.addPost('silo1', '/02.html')
+    cache.addPost('silo2', '/03.html')
+
+    assert cache.wasPosted('silo1', '/01.html')
+    assert not cache.wasPosted('silo1', '/03.html')
+
+    uris = ['/01.html', '/02.html', '/03.html', '/04.html']
+    assert cache.getPostedUris('silo1', uris) == {'/01.html', '/02.html'}
+    assert cache.getPostedUris('silo2', uris) == {'/03.html'}
+    assert cache.getPostedUris('silo3', uris) == set()
+    assert cache.getPostedUris('silo1', []) == set()
+
+
+def test_many_posted_uris(cache):
+    uris = ['/%04d.html' % i for i in range(1200)]
+    for u in uris[::2]:
+        cache.addPost('silo1', u)
+    assert cache.getPostedUris('silo1', uris) == set(uris[::2])
+
+
+def test_null_cache_posted_uris():
+    cache = NullCache()
+    cache.addPost('silo1', '/01.html')
+    assert cache.getPostedUris('silo1', ['/01.html']) == set()
+
+
+def test_sqlite_cache_migration_from_v1(tmp_path):
+    import sqlite3
+
+    dbpath = str(tmp_path / 'silorider.db')
+    conn = sqlite3.connect(dbpath)
+    conn.executescript('''
+        CREATE TABLE info (
+            name text PRIMARY KEY NOT NULL,
+            str_val text,
+            real_val real,
+            int_val int
+        );
+        INSERT INTO info (name, int_val) VALUES ('schema_version', 1);
+        INSERT INTO info (name, str_val) VALUES ('silo1_token', 'TOKEN');
+        CREATE TABLE posted (
+            id integer PRIMARY KEY,
+            silo text NOT NULL,
+            uri text NOT NULL,
+            posted_on timestamp
+        );
+        CREATE INDEX index_silo ON posted(silo);
+        CREATE INDEX index_uri ON posted(uri);
+        INSERT INTO posted (silo, uri) VALUES ('silo1', '/01.html');
+        INSERT INTO posted (silo, uri) VALUES ('silo1', '/01.html');
+        INSERT INTO posted (silo, uri) VALUES ('silo2', '/01.html');
+    ''')
+    conn.commit()
+    conn.close()
+
+    cache = SqliteCache(dbpath, None)
+    assert cache.getCustomValue('schema_version', valtype=int) == \
+        SqliteCache.SCHEMA_VERSION
+    assert cache.getCustomValue('silo1_token') == 'TOKEN'
+    assert cache.wasPosted('silo1', '/01.html')
+    assert cache.wasPosted('silo2', '/01.html')
+
+    count = cache.conn.execute('SELECT COUNT(*) FROM posted').fetchone()[0]
+    assert count == 2
+
+    # Adding a post twice doesn't create duplicates anymore.
+    cache.addPost('silo1', '/01.html')
+    count = cache.conn.execute('SELECT COUNT(*) FROM posted').fetchone()[0]
+    assert count == 2
+
+    journal_mode = cache.conn.execute('PRAGMA journal_mode').fetchone()[0]
+    assert journal_mode == 'wal'
+
+
+def test_batched_writes(cache):
+    with cache.batch():
+        cache.addPosts('silo1', ['/01.html', '/02.html'])
+        cache.addPost('silo1', '/03.html')
+        cache.setCustomValue('silo1_token', 'TOKEN')
+        # Writes are visible inside the batch.
+        assert cache.wasPosted('silo1', '/02.html')
+
+    assert cache.getPostedUris('silo1', ['/01.html', '/02.html', '/03.html']) == \
+        {'/01.html', '/02.html', '/03.html'}
+    assert cache.getCustomValue('silo1_token') == 'TOKEN'
+
+
+def test_sqlite_batch_commits(tmp_path):
+    dbpath = str(tmp_path / 'silorider.db')
+    cache = SqliteCache(dbpath, None)
+    with cache.batch():
+        cache.addPosts('silo1', ['/01.html', '/02.html'])
+        assert cache.conn.in_transaction
+    assert not cache.conn.in_transaction
+
+    other = SqliteCache(dbpath, None)
+    assert other.getPostedUris('silo1', ['/01.html', '/02.html']) == \
+        {'/01.html', '/02.html'}
+
+
+def test_read_through_cache(tmp_path):
+    backend = SqliteCache(str(tmp_path / 'silorider.db'), None)
+    backend.addPost('silo1', '/01.html')
+    backend.setCustomValue('silo1_token', 'TOKEN')
+
+    cache = ReadThroughCache(backend)
+    assert cache.wasPosted('silo1', '/01.html')
+    assert cache.getCustomValue('silo1_token') == 'TOKEN'
+
+    # Reads are now served from memory...
+    backend.addPost('silo1', '/02.html')
+    backend.setCustomValue('silo1_token', 'OTHER_TOKEN')
+    assert not cache.wasPosted('silo1', '/02.html')
+    assert cache.getCustomValue('silo1_token') == 'TOKEN'
+
+    # ...and writes go through.
+    cache.addPost('silo1', '/03.html')
+    cache.setCustomValue('silo1_token', 'NEW_TOKEN')
+    assert cache.wasPosted('silo1', '/03.html')
+    assert backend.wasPosted('silo1', '/03.html')
+    assert cache.getCustomValue('silo1_token') == 'NEW_TOKEN'
+    assert backend.getCustomValue('silo1_token') == 'NEW_TOKEN'
+
+
+def test_load_cache_read_through(tmp_path):
+    import configparser
+    from silorider.cache.base import load_cache
+
+    config = configparser.ConfigParser(interpolation=None)
+    config.read_dict({'cache': {'uri': 'sqlite://silorider.db'}})
+    assert isinstance(load_cache(config, str(tmp_path)), SqliteCache)
+    assert isinstance(load_cache(config, str(tmp_path), True),
+                      ReadThroughCache)
+
+    config.set('cache', 'read_through', 'false')
+    assert isinstance(load_cache(config, str(tmp_path), True), SqliteCache)
+    config.set('cache', 'read_through', 'true')
+    assert isinstance(load_cache(config, str(tmp_path)), ReadThroughCache)
+
+
+def test_uri_key_set():
+    uris = ['https://example.org/%04d.html' % i for i in range(3000)]
+    keys = UriKeySet(uris[:1000])
+    assert len(keys) == 1000
+    assert uris[0] in keys
+    assert uris[1000] not in keys
+
+    keys.update(uris[1000:])
+    assert len(keys) == 3000
+    for u in uris:
+        assert u in keys
+    assert 'https://example.org/other.html' not in keys
+    assert keys.intersection(['https://example.org/0001.html', 'other']) == \
+        {'https://example.org/0001.html'}
+
+
+def _colliding_uri_key(uri):
+    # Make all URIs of the same length collide.
+    return len(uri)
+
+
+def test_uri_key_set_collisions(monkeypatch):
+    import silorider.cache.urikeys
+    monkeypatch.setattr(silorider.cache.urikeys, 'get_uri_key',
+                        _colliding_uri_key)
+
+    keys = UriKeySet(['/01.html', '/02.html'])
+    assert '/01.html' in keys
+    assert '/02.html' in keys
+    assert '/03.html' not in keys
+    keys.add('/03.html')
+    assert '/03.html' in keys
+
+    # Collisions with URIs added later can't be detected.
+    keys = UriKeySet()
+    keys.add('/01.html')
+    assert '/02.html' in keys
+
+
+def test_sqlite_cache_collisions(tmp_path, monkeypatch):
+    import silorider.cache.sqlite
+    monkeypatch.setattr(silorider.cache.sqlite, 'get_uri_key',
+                        _colliding_uri_key)
+
+    cache = SqliteCache(str(tmp_path / 'silorider.db'), None)
+    cache.addPost('silo1', '/01.html')
+    cache.addPost('silo1', '/02.html')
+    cache.addPost('silo1', '/02.html')
+    assert cache.wasPosted('silo1', '/01.html')
+    assert not cache.wasPosted('silo1', '/03.html')
+    assert cache.getPostedUris('silo1', ['/02.html', '/03.html']) == \
+        {'/02.html'}
+    count = cache.conn.execute('SELECT COUNT(*) FROM posted').fetchone()[0]
+    assert count == 2
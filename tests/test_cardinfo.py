@@ -0,0 +1,188 @@
+import pytest
+import silorider.fetch
+import silorider.format
+from silorider.cache.memory import MemoryCache
+from silorider.cardinfo import (
+    CardMetaCache, read_head_metas)
+from silorider.format import format_entry, CardProps
+from .mockutil import MockResponse
+
+
+test_url = 'https://example.org/article'
+
+test_page = b"""<html>
+<head>
+<meta name="twitter:description" content="Twitter blurb">
+<meta name="twitter:image" content="https://example.org/card.jpg">
+<meta property="og:description" content="Open Graph blurb">
+</head>
+<body>
+<meta name="twitter:description" content="Not in the head">
+<p>Lots of text...</p>
+</body>
+</html>"""
+
+
+class _MockHttp:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def __call__(self, url, headers=None, stream=False):
+        self.requests.append((url, headers))
+        return self.responses.pop(0)
+
+
+def _make_test_entry():
+    class TestEntry:
+        def __init__(self):
+            self.is_micropost = False
+            self.url = test_url
+
+        def get(self, _):
+            return "Article title"
+
+        def htmlFind(self, *args, **kwargs):
+            return "Article title"
+
+    return TestEntry()
+
+
+test_metas = {
+    'name': {
+        'twitter:description': 'Twitter blurb',
+        'twitter:image': 'https://example.org/card.jpg'},
+    'property': {
+        'og:description': 'Open Graph blurb'}}
+
+
+def test_read_head_metas():
+    metas = read_head_metas(MockResponse(200, test_page))
+    assert metas == test_metas
+
+
+def test_read_head_metas_implicit_head():
+    metas = read_head_metas(MockResponse(
+        200,
+        b'<meta name="twitter:description" content="Blurb">'
+        b'<p>Some text</p>'
+        b'<meta name="twitter:image" content="not-in-head.jpg">'))
+    assert metas == {'name': {'twitter:description': 'Blurb'}}
+
+
+def test_read_head_metas_stops_after_head():
+    page = test_page.replace(
+        b'</head>',
+        b'<link rel="stylesheet" href="/style.css">\n' * 100 + b'</head>')
+    resp = MockResponse(200, page + b'<p>More text</p>' * 1000)
+    metas = read_head_metas(resp, chunk_size=64)
+    assert metas == test_metas
+    # We only read up to the chunk where the head ends.
+    head_end = page.index(b'</head>') + len('</head>')
+    assert resp.chunks_read == (head_end - 1) // 64 + 1
+
+
+def test_read_head_metas_charset():
+    page = ('<head><meta name="twitter:description" content="Café"></head>'
+            .encode('latin1'))
+    resp = MockResponse(200, page,
+                         {'Content-Type': 'text/html; charset=ISO-8859-1'})
+    metas = read_head_metas(resp, chunk_size=3)
+    assert metas == {'name': {'twitter:description': 'Café'}}
+
+
+@pytest.mark.parametrize("charset_meta", [
+    b'<meta charset="windows-1252">',
+    b'<meta http-equiv="Content-Type" '
+    b'content="text/html; charset=windows-1252">'])
+def test_read_head_metas_meta_charset(charset_meta):
+    page = (b'<head>' + charset_meta +
+            '<meta name="twitter:description" content="Café €5"></head>'
+            .encode('cp1252'))
+    resp = MockResponse(200, page, {'Content-Type': 'text/html'})
+    metas = read_head_metas(resp, chunk_size=16)
+    assert metas == {'name': {'twitter:description': 'Café €5'}}
+
+
+def test_read_head_metas_header_charset_wins():
+    page = ('<head><meta charset="windows-1252">'
+            '<meta name="twitter:description" content="Café"></head>'
+            .encode('utf8'))
+    resp = MockResponse(200, page,
+                         {'Content-Type': 'text/html; charset=utf-8'})
+    metas = read_head_metas(resp)
+    assert metas['name'] == {'twitter:description': 'Café'}
+
+
+def test_card_info_downloaded_once(monkeypatch):
+    http = _MockHttp([MockResponse(200, test_page)])
+    monkeypatch.setattr(silorider.fetch, 'http_get', http)
+    monkeypatch.setattr(silorider.format, '_disable_get_card_info', False)
+
+    card_cache = CardMetaCache()
+    entry = _make_test_entry()
+    card1 = format_entry(entry, add_url=False, card_cache=card_cache,
+                         card_props=CardProps('name', 'twitter'))
+    card2 = format_entry(entry, add_url=False, card_cache=card_cache,
+                         card_props=CardProps('property', 'og'))
+    assert card1.text == 'Twitter blurb'
+    assert card1.image == 'https://example.org/card.jpg'
+    assert card2.text == 'Open Graph blurb'
+    assert card2.image is None
+    assert len(http.requests) == 1
+
+
+def test_card_info_persisted(monkeypatch):
+    http = _MockHttp([
+        MockResponse(200, test_page, {'ETag': '"abc"'}),
+        MockResponse(304)])
+    monkeypatch.setattr(silorider.fetch, 'http_get', http)
+
+    cache = MemoryCache()
+    metas1 = CardMetaCache(cache).getPageMetas(test_url)
+    metas2 = CardMetaCache(cache).getPageMetas(test_url)
+    assert metas1 == metas2
+    assert metas2['name']['twitter:description'] == 'Twitter blurb'
+    assert http.requests == [
+        (test_url, {}),
+        (test_url, {'If-None-Match': '"abc"'})]
+
+
+def test_card_info_not_persisted_without_validators(monkeypatch):
+    http = _MockHttp([
+        MockResponse(200, test_page),
+        MockResponse(200, test_page)])
+    monkeypatch.setattr(silorider.fetch, 'http_get', http)
+
+    cache = MemoryCache()
+    CardMetaCache(cache).getPageMetas(test_url)
+    CardMetaCache(cache).getPageMetas(test_url)
+    assert http.requests == [(test_url, {}), (test_url, {})]
+
+
+def test_card_info_shared_between_silos(cli, feedutil, mastmock, monkeypatch):
+    feed = cli.createTempFeed(feedutil.makeFeed(
+        """<h1 class="p-name">A new article</h1>
+<div class="e-content">
+<p>This is the text of the article.</p>
+</div>
+<a class="u-url" href="https://example.org/a-new-article">permalink</a>"""
+    ))
+
+    cli.appendSiloConfig('test1', 'mastodon', url='/blah1')
+    cli.appendSiloConfig('test2', 'mastodon', url='/blah2')
+    cli.setFeedConfig('feed', feed)
+    mastmock.installTokens(cli, 'test1')
+    mastmock.installTokens(cli, 'test2')
+
+    # Don't use a card image, we would have to download it.
+    http = _MockHttp([MockResponse(
+        200, b'<head><meta name="twitter:description" content="A blurb">')])
+    monkeypatch.setattr(silorider.fetch, 'http_get', http)
+    monkeypatch.setattr(silorider.format, '_disable_get_card_info', False)
+
+    ctx, _ = cli.run('process')
+    assert http.requests == [('https://example.org/a-new-article', {})]
+    for silo in ctx.silos:
+        assert silo.client.toots[0] == (
+            'A blurb https://example.org/a-new-article', None, 'public')
@@ -0,0 +1,126 @@
+import configparser
+from silorider.commands.process import get_config_fingerprint
+
+
+def test_two_feeds_concurrently(cli, feedutil, mastmock):
+    feed1 = cli.createTempFeed(feedutil.makeFeed(
+        """<p class="p-name">This is a quick update.</p>
+<a class="u-url" href="/01234.html">permalink</a>"""))
+    feed2 = cli.createTempFeed(feedutil.makeFeed(
+        """<p class="p-name">This is another quick update.</p>
+<a class="u-url" href="/56789.html">permalink</a>"""))
+
+    cli.appendConfig('[process]\nfeed_workers=2\n')
+    cli.appendSiloConfig('test', 'mastodon', url='/blah')
+    cli.setFeedConfig('feed1', feed1)
+    cli.appendFeedConfig('feed2', feed2)
+    mastmock.installTokens(cli, 'test')
+
+    ctx, _ = cli.run('process')
+    assert ctx.cache.wasPosted('test', '/01234.html')
+    assert ctx.cache.wasPosted('test', '/56789.html')
+    toots = sorted(ctx.silos[0].client.toots)
+    assert toots == [
+        ("This is a quick update.", None, 'public'),
+        ("This is another quick update.", None, 'public')]
+
+
+def test_two_silos_in_parallel(cli, feedutil, mastmock):
+    feed = cli.createTempFeed(feedutil.makeFeed(
+        """<p class="p-name">This is a quick update.</p>
+<a class="u-url" href="/01234.html">permalink</a>"""))
+
+    cli.appendConfig('[process]\nsilo_workers=2\n')
+    cli.appendSiloConfig('test1', 'mastodon', url='/blah1')
+    cli.appendSiloConfig('test2', 'mastodon', url='/blah2')
+    cli.setFeedConfig('feed', feed)
+    mastmock.installTokens(cli, 'test1')
+    mastmock.installTokens(cli, 'test2')
+
+    ctx, _ = cli.run('process')
+    for silo in ctx.silos:
+        assert ctx.cache.wasPosted(silo.name, '/01234.html')
+        assert silo.client.toots == [
+            ("This is a quick update.", None, 'public')]
+
+
+def test_client_not_created_when_nothing_new(cli, feedutil, mastmock):
+    feed = cli.createTempFeed(feedutil.makeFeed(
+        """<p class="p-name">This is a quick update.</p>
+<a class="u-url" href="/01234.html">permalink</a>"""))
+
+    cli.appendSiloConfig('test', 'mastodon', url='/blah')
+    cli.setFeedConfig('feed', feed)
+    mastmock.installTokens(cli, 'test')
+    cli.preExecHook(lambda ctx: ctx.cache.addPost('test', '/01234.html'))
+
+    ctx, _ = cli.run('process')
+    assert ctx.silos[0].client is None
+
+
+def test_silo_failing_to_start(cli, feedutil, mastmock):
+    feed = cli.createTempFeed(feedutil.makeFeed(
+        """<p class="p-name">This is a quick update.</p>
+<a class="u-url" href="/01234.html">permalink</a>"""))
+
+    cli.appendSiloConfig('test1', 'mastodon', url='/blah1')
+    cli.appendSiloConfig('test2', 'mastodon', url='/blah2')
+    cli.setFeedConfig('feed', feed)
+    # Only the second silo is authenticated.
+    mastmock.installTokens(cli, 'test2')
+
+    ctx, _ = cli.run('process')
+    assert not ctx.cache.wasPosted('test1', '/01234.html')
+    assert ctx.cache.wasPosted('test2', '/01234.html')
+    assert ctx.silos[0].client is None
+    assert ctx.silos[1].client.toots == [
+        ("This is a quick update.", None, 'public')]
+
+
+def test_config_change_reprocesses_feed(cli, feedutil, mastmock, tmp_path):
+    feed = str(tmp_path / 'feed.html')
+    with open(feed, 'w', encoding='utf8') as fp:
+        fp.write(feedutil.makeFeed(
+            """<p class="p-name">This is a quick update.</p>
+<a class="u-url" href="/01234.html">permalink</a>"""))
+
+    cli.setConfig('[cache]\nuri=sqlite://%s\n' % (tmp_path / 'cache.db'))
+    cli.appendSiloConfig('test1', 'mastodon', url='/blah1')
+    cli.setFeedConfig('feed', feed)
+    mastmock.installTokens(cli, 'test1')
+    mastmock.installTokens(cli, 'test2')
+
+    ctx, _ = cli.run('process')
+    assert ctx.cache.wasPosted('test1', '/01234.html')
+
+    # The feed didn't change, but there's a new silo to post it to.
+    cli.appendSiloConfig('test2', 'mastodon', url='/blah2')
+    ctx, _ = cli.run('process')
+    assert ctx.cache.wasPosted('test2', '/01234.html')
+    assert ctx.silos[0].client is None
+    assert ctx.silos[1].client.toots == [
+        ("This is a quick update.", None, 'public')]
+
+    # Nothing changed now.
+    ctx, _ = cli.run('process')
+    assert ctx.silos[0].client is None
+    assert ctx.silos[1].client is None
+
+
+def test_config_fingerprint():
+    class _Silo:
+        def __init__(self, name):
+            self.name = name
+
+    def _get(cfgtxt, silo_names=('one',)):
+        config = configparser.ConfigParser(interpolation=None)
+        config.read_string(cfgtxt)
+        return get_config_fingerprint(
+            config, 'feed', [_Silo(n) for n in silo_names])
+
+    base = _get('[urls]\nfeed=/feed\n')
+    assert base == _get('[urls]\nfeed=/other-feed\n')
+    assert base == _get('[classes:other]\n.post=h-entry\n')
+    assert base != _get('[urls]\nfeed=/feed\n', ('one', 'two'))
+    assert base != _get('[classes:feed]\n.post=h-entry\n')
+    assert base != _get('[filter]\nexclude_category=private\n')
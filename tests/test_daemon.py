@@ -0,0 +1,50 @@
+import configparser
+from silorider.commands.daemon import get_poll_interval
+
+
+def test_poll_interval():
+    config = configparser.ConfigParser(interpolation=None)
+    config.read_string("""
+[daemon]
+interval=600
+jitter=0
+interval_fast=60
+""")
+    assert get_poll_interval(config, 'blog') == 600
+    assert get_poll_interval(config, 'fast') == 60
+
+    config.set('daemon', 'jitter', '30')
+    for _ in range(10):
+        interval = get_poll_interval(config, 'blog')
+        assert 600 <= interval <= 630
+
+
+def test_poll_interval_defaults():
+    config = configparser.ConfigParser(interpolation=None)
+    interval = get_poll_interval(config, 'blog')
+    assert 15 * 60 <= interval <= 16 * 60
+
+
+def test_daemon_polls_feeds(cli, feedutil, mastmock):
+    feed1 = cli.createTempFeed(feedutil.makeFeed(
+        """<p class="p-name">This is a quick update.</p>
+<a class="u-url" href="/01234.html">permalink</a>"""))
+    feed2 = cli.createTempFeed(feedutil.makeFeed(
+        """<p class="p-name">This is another quick update.</p>
+<a class="u-url" href="/56789.html">permalink</a>"""))
+
+    cli.appendConfig('[daemon]\ninterval=0\njitter=0\n')
+    cli.appendSiloConfig('test', 'mastodon', url='/blah')
+    cli.setFeedConfig('feed1', feed1)
+    cli.appendFeedConfig('feed2', feed2)
+    mastmock.installTokens(cli, 'test')
+
+    ctx, _ = cli.run('daemon', '--max-polls', '4')
+    assert ctx.cache.wasPosted('test', '/01234.html')
+    assert ctx.cache.wasPosted('test', '/56789.html')
+    # Each entry is only posted once even though each feed was polled
+    # twice.
+    toots = sorted(ctx.silos[0].client.toots)
+    assert toots == [
+        ("This is a quick update.", None, 'public'),
+        ("This is another quick update.", None, 'public')]
@@ -0,0 +1,122 @@
+import configparser
+import silorider.fetch
+from silorider.cache.memory import MemoryCache
+from silorider.fetch import FetchCache, FetchResult, fetch_url
+from .mockutil import MockResponse
+
+
+def test_fetch_cache_roundtrip():
+    fc = FetchCache(MemoryCache())
+    assert fc.get('https://example.org') is None
+
+    fc.set(FetchResult('https://example.org', b'<html></html>',
+                       etag='"abc"'))
+    res = fc.get('https://example.org')
+    assert res.etag == '"abc"'
+    assert res.last_modified is None
+    assert res.body == '<html></html>'
+
+    fc.forget('https://example.org')
+    assert fc.get('https://example.org') is None
+
+
+def test_fetch_cache_ignores_pages_without_validators():
+    fc = FetchCache(MemoryCache())
+    fc.set(FetchResult('https://example.org', b'<html></html>'))
+    assert fc.get('https://example.org') is None
+
+
+def test_fetch(monkeypatch):
+    def _http_get(url, headers=None, stream=False):
+        assert headers == {}
+        return MockResponse(200, b'<html></html>', {
+            'ETag': '"abc"',
+            'Content-Type': 'text/html; charset=utf-8'})
+
+    monkeypatch.setattr(silorider.fetch, 'http_get', _http_get)
+
+    res = fetch_url('https://example.org')
+    assert not res.not_modified
+    assert res.body == b'<html></html>'
+    assert res.size == 13
+    assert res.etag == '"abc"'
+    assert res.charset == 'utf-8'
+
+
+def test_fetch_not_modified(monkeypatch):
+    requests = []
+
+    def _http_get(url, headers=None, stream=False):
+        requests.append(headers)
+        return MockResponse(304)
+
+    monkeypatch.setattr(silorider.fetch, 'http_get', _http_get)
+
+    cached = FetchResult('https://example.org', '<html></html>',
+                         etag='"abc"', last_modified='yesterday')
+    res = fetch_url('https://example.org', cached)
+    assert res.not_modified
+    assert res.body == '<html></html>'
+    assert requests[0]['If-None-Match'] == '"abc"'
+    assert requests[0]['If-Modified-Since'] == 'yesterday'
+
+
+def test_http_session_is_shared():
+    config = configparser.ConfigParser(interpolation=None)
+    config.read_dict({'http': {'max_connections': '2'}})
+    silorider.fetch.configure_http(config)
+    try:
+        session = silorider.fetch.get_http_session()
+        assert silorider.fetch.get_http_session() is session
+        adapter = session.get_adapter('https://example.org')
+        assert adapter._pool_maxsize == 2
+        assert adapter._pool_block
+    finally:
+        silorider.fetch.configure_http(configparser.ConfigParser())
+
+
+def test_parse_url_skips_unchanged_feed(feedutil, tmp_path):
+    from silorider.parse import parse_url
+
+    feed_path = str(tmp_path / 'feed.html')
+    with open(feed_path, 'w', encoding='utf8') as fp:
+        fp.write(feedutil.makeFeed(
+            """<p class="p-name">This is a quick update.</p>
+<a class="u-url" href="/01234.html">permalink</a>"""))
+    config = configparser.ConfigParser(interpolation=None)
+    fc = FetchCache(MemoryCache())
+
+    feed = parse_url(feed_path, 'feed', config,
+                     fetch_cache=fc, skip_unchanged=True)
+    assert not feed.is_unchanged
+    assert len(feed.entries) == 1
+
+    fc.setDigest('feed', feed.fetch_result.digest)
+    feed = parse_url(feed_path, 'feed', config,
+                     fetch_cache=fc, skip_unchanged=True)
+    assert feed.is_unchanged
+    assert feed.entries == []
+
+
+def test_download_local_file(tmp_path):
+    src_path = tmp_path / 'src.jpg'
+    src_path.write_bytes(b'not really a jpeg')
+    dst_path = str(tmp_path / 'dst.jpg')
+    res = silorider.fetch.download_file(src_path.as_uri(), dst_path)
+    assert res == dst_path
+    with open(dst_path, 'rb') as fp:
+        assert fp.read() == b'not really a jpeg'
+
+
+def test_fetch_cache_fingerprint():
+    cache = MemoryCache()
+    fc = FetchCache(cache, 'one')
+    fc.set(FetchResult('https://example.org', b'<html></html>',
+                       etag='"abc"'))
+    fc.setDigest('feed', 'abcdef')
+    assert fc.get('https://example.org').etag == '"abc"'
+    assert fc.getDigest('feed') == 'abcdef'
+
+    fc = FetchCache(cache, 'two')
+    assert fc.get('https://example.org') is None
+    assert fc.getDigest('feed') is None
@@ -0,0 +1,159 @@
+import socket
+import configparser
+import urllib.request
+import pytest
+from silorider import metrics
+
+
+@pytest.fixture
+def registry():
+    # The registry is global, and other tests add to it.
+    metrics.registry.reset()
+    yield metrics.registry
+    metrics.registry.reset()
+
+
+def test_format_metrics():
+    registry = metrics.MetricsRegistry()
+    c = registry.counter('test_things_total', "Some things.", ['kind'])
+    g = registry.gauge('test_level', "Some level.")
+    h = registry.histogram('test_duration_seconds', "Some durations.",
+                           ['kind'], buckets=(0.1, 1.0))
+
+    c.inc(kind='a')
+    c.inc(2, kind='a')
+    c.inc(kind='b "quoted"')
+    g.set(1.5)
+    h.observe(0.05, kind='a')
+    h.observe(0.5, kind='a')
+    h.observe(5, kind='a')
+    assert c.getValue(kind='a') == 3
+
+    assert registry.formatText() == """# HELP test_things_total Some things.
+# TYPE test_things_total counter
+test_things_total{kind="a"} 3
+test_things_total{kind="b \\"quoted\\""} 1
+# HELP test_level Some level.
+# TYPE test_level gauge
+test_level 1.5
+# HELP test_duration_seconds Some durations.
+# TYPE test_duration_seconds histogram
+test_duration_seconds_bucket{kind="a",le="0.1"} 1
+test_duration_seconds_bucket{kind="a",le="1.0"} 2
+test_duration_seconds_bucket{kind="a",le="+Inf"} 3
+test_duration_seconds_sum{kind="a"} 5.55
+test_duration_seconds_count{kind="a"} 3
+"""
+
+
+def test_write_textfile(registry, tmp_path):
+    metrics.entries_seen.inc(4, feed='blog')
+
+    path = str(tmp_path / 'silorider.prom')
+    metrics.write_textfile(path)
+    with open(path, 'r', encoding='utf8') as fp:
+        text = fp.read()
+    assert 'silorider_entries_seen_total{feed="blog"} 4\n' in text
+    assert list(tmp_path.iterdir()) == [tmp_path / 'silorider.prom']
+
+
+def test_http_server(registry):
+    metrics.entries_seen.inc(2, feed='blog')
+
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    config = configparser.ConfigParser(interpolation=None)
+    config.read_dict({'metrics': {'http_port': str(port)}})
+
+    server = metrics.start_http_server(config)
+    try:
+        url = 'http://127.0.0.1:%d/metrics' % port
+        with urllib.request.urlopen(url) as resp:
+            text = resp.read().decode('utf8')
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert 'silorider_entries_seen_total{feed="blog"} 2\n' in text
+
+
+def test_process_metrics(registry, cli, feedutil, mastmock, tmp_path):
+    feed = cli.createTempFeed(feedutil.makeFeed(
+        """<p class="p-name">This is a quick update.</p>
+<a class="u-url" href="/01234.html">permalink</a>"""))
+
+    metrics_path = str(tmp_path / 'silorider.prom')
+    cli.appendConfig('[metrics]\ntextfile=%s\n' % metrics_path)
+    cli.appendSiloConfig('test', 'mastodon', url='/blah')
+    cli.setFeedConfig('feed', feed)
+    mastmock.installTokens(cli, 'test')
+
+    ctx, _ = cli.run('process')
+    assert ctx.cache.wasPosted('test', '/01234.html')
+
+    with open(metrics_path, 'r', encoding='utf8') as fp:
+        text = fp.read()
+    assert 'silorider_entries_seen_total{feed="feed"} 1\n' in text
+    assert ('silorider_entries_posted_total{feed="feed",silo="test"} 1\n'
+            in text)
+    assert ('silorider_stage_duration_seconds_count'
+            '{stage="fetch",feed="feed",silo=""} 1\n') in text
+    assert ('silorider_stage_duration_seconds_count'
+            '{stage="post",feed="feed",silo="test"} 1\n') in text
+    assert 'silorider_last_run_timestamp_seconds{command="process"}' in text
+
+
+def test_populate_metrics(registry, cli, feedutil, mastmock, tmp_path):
+    feed = cli.createTempFeed(feedutil.makeFeed(
+        """<p class="p-name">This is a quick update.</p>
+<a class="u-url" href="/01234.html">permalink</a>"""))
+
+    metrics_path = str(tmp_path / 'silorider.prom')
+    cli.appendConfig('[metrics]\ntextfile=%s\n' % metrics_path)
+    cli.appendSiloConfig('test', 'mastodon', url='/blah')
+    cli.setFeedConfig('feed', feed)
+
+    ctx, _ = cli.run('populate')
+    assert ctx.cache.wasPosted('test', '/01234.html')
+
+    with open(metrics_path, 'r', encoding='utf8') as fp:
+        text = fp.read()
+    assert ('silorider_entries_populated_total{feed="feed",silo="test"} 1\n'
+            in text)
+    assert ('silorider_stage_duration_seconds_count'
+            '{stage="fetch",feed="feed",silo=""} 1\n') in text
+    assert ('silorider_stage_duration_seconds_count'
+            '{stage="cache_read",feed="feed",silo="test"} 1\n') in text
+    assert ('silorider_stage_duration_seconds_count'
+            '{stage="cache_write",feed="feed",silo=""} 1\n') in text
+
+
+def test_post_failure_counted_once(registry, cli, feedutil, mastmock,
+                                   monkeypatch):
+    from silorider.silos.mastodon import MastodonSilo
+
+    feed = cli.createTempFeed(feedutil.makeFeed(
+        """<p class="p-name">This is a quick update.</p>
+<a class="u-url" href="/01234.html">permalink</a>"""))
+
+    cli.appendConfig('[process]\nsilo_workers=2\n')
+    cli.appendSiloConfig('test1', 'mastodon', url='/blah1')
+    cli.appendSiloConfig('test2', 'mastodon', url='/blah2')
+    cli.setFeedConfig('feed', feed)
+    mastmock.installTokens(cli, 'test1')
+    mastmock.installTokens(cli, 'test2')
+
+    orig_post_entry = MastodonSilo.postEntry
+
+    def _post_entry(self, entry_card, media_ids, ctx):
+        if self.name == 'test1':
+            raise Exception("Can't post!")
+        return orig_post_entry(self, entry_card, media_ids, ctx)
+
+    monkeypatch.setattr(MastodonSilo, 'postEntry', _post_entry)
+
+    # We run in verbose mode, so the error is re-raised.
+    with pytest.raises(Exception):
+        cli.run('process')
+    assert metrics.post_failures.getValue(feed='feed', silo='test1') == 1
+    assert metrics.post_failures.getValue(feed='feed', silo='test2') is None
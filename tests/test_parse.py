@@ -0,0 +1,93 @@
+import configparser
+import pytest
+from silorider.parse import parse_url
+
+
+feed1 = """
+<html><body class="h-feed">
+    <article class="h-entry">
+      <h1 class="p-name">First article</h1>
+      <div class="e-content"><p>Some text.</p></div>
+      <div><time class="dt-published" datetime="2018-01-07T09:30:00-00:00"></time></div>
+      <a class="u-url" href="https://example.org/first-article">permalink</a>
+    </article>
+    <article class="h-entry">
+      <p class="p-name">A quick update.</p>
+      <div><span class="posted-on">2018-01-08 09:30:00</span></div>
+      <a class="u-url" href="https://example.org/quick-update">permalink</a>
+    </article>
+</body></html>"""  # NOQA
+
+
+@pytest.mark.parametrize("mode", ['default', 'single'])
+def test_parse_modes(mode, tmp_path):
+    feed_path = str(tmp_path / 'feed.html')
+    with open(feed_path, 'w', encoding='utf8') as fp:
+        fp.write(feed1)
+
+    config = configparser.ConfigParser(interpolation=None)
+    config.read_dict({
+        'parse': {'mode': mode},
+        'classes:feed': {'.posted-on': 'dt-published'}})
+
+    feed = parse_url(feed_path, 'feed', config)
+    assert [e.url for e in feed.entries] == [
+        'https://example.org/first-article',
+        'https://example.org/quick-update']
+    assert feed.entries[0].htmlFind(class_='p-name').string == 'First article'
+    assert feed.entries[1].get('published').day == 8
+
+
+def test_parse_single_mode_without_class_rules(tmp_path):
+    feed_path = str(tmp_path / 'feed.html')
+    with open(feed_path, 'w', encoding='utf8') as fp:
+        fp.write(feed1)
+
+    config = configparser.ConfigParser(interpolation=None)
+    config.read_dict({'parse': {'mode': 'single'}})
+
+    feed = parse_url(feed_path, 'feed', config)
+    assert len(feed.entries) == 2
+    urls = [e.url for e in feed.entries]
+    assert 'https://example.org/quick-update' in urls
+    for e in feed.entries:
+        assert e.html_element.name == 'article'
+
+
+feed2 = """
+<html><body class="h-feed">
+    <article class="h-entry">
+      <p class="p-name">Fourth update.</p>
+      <a class="u-url" href="/04.html">permalink</a>
+    </article>
+    <article class="h-entry">
+      <p class="p-name">Third update.</p>
+      <a class="u-url" href="/03.html">permalink</a>
+    </article>
+    <article class="h-entry">
+      <p class="p-name">Second update.</p>
+      <a class="u-url" href="/02.html">permalink</a>
+    </article>
+    <article class="h-entry">
+      <p class="p-name">First update.</p>
+      <a class="u-url" href="/01.html">permalink</a>
+    </article>
+</body></html>"""
+
+
+@pytest.mark.parametrize("done, stop_after, expected", [
+    ([], 2, ['/04.html', '/03.html', '/02.html', '/01.html']),
+    (['/03.html'], 0, ['/04.html', '/02.html', '/01.html']),
+    (['/03.html', '/02.html'], 2, ['/04.html']),
+    (['/03.html', '/01.html'], 2, ['/04.html', '/02.html']),
+])
+def test_parse_incremental(done, stop_after, expected, tmp_path):
+    feed_path = str(tmp_path / 'feed.html')
+    with open(feed_path, 'w', encoding='utf8') as fp:
+        fp.write(feed2)
+
+    config = configparser.ConfigParser(interpolation=None)
+    feed = parse_url(feed_path, 'feed', config,
+                     get_done_urls=lambda urls: set(urls) & set(done),
+                     stop_after_done=stop_after)
+    assert sorted([e.url for e in feed.entries], reverse=True) == expected
@@ -0,0 +1,47 @@
+import pstats
+
+
+def test_process_profile(cli, feedutil, mastmock, tmp_path):
+    feed = cli.createTempFeed(feedutil.makeFeed(
+        """<p class="p-name">This is a quick update.</p>
+<a class="u-url" href="/01234.html">permalink</a>"""))
+
+    cli.appendSiloConfig('test', 'mastodon', url='/blah')
+    cli.setFeedConfig('feed', feed)
+    mastmock.installTokens(cli, 'test')
+
+    profile_path = str(tmp_path / 'silorider.prof')
+    ctx, _ = cli.run('--profile', profile_path, 'process')
+    assert ctx.cache.wasPosted('test', '/01234.html')
+
+    stats = pstats.Stats(profile_path)
+    func_names = set([f[2] for f in stats.stats.keys()])
+    assert 'parse_url' in func_names
+    assert 'postEntry' in func_names
+
+
+def test_process_profile_per_feed(cli, feedutil, mastmock, tmp_path):
+    feed1 = cli.createTempFeed(feedutil.makeFeed(
+        """<p class="p-name">This is a quick update.</p>
+<a class="u-url" href="/01234.html">permalink</a>"""))
+    feed2 = cli.createTempFeed(feedutil.makeFeed(
+        """<p class="p-name">This is another quick update.</p>
+<a class="u-url" href="/56789.html">permalink</a>"""))
+
+    cli.appendConfig('[process]\nfeed_workers=2\n')
+    cli.appendSiloConfig('test', 'mastodon', url='/blah')
+    cli.setFeedConfig('feed1', feed1)
+    cli.appendFeedConfig('feed2', feed2)
+    mastmock.installTokens(cli, 'test')
+
+    profile_path = str(tmp_path / 'silorider.prof')
+    ctx, _ = cli.run('--profile', profile_path, '--profile-split', 'process')
+    assert ctx.cache.wasPosted('test', '/01234.html')
+    assert ctx.cache.wasPosted('test', '/56789.html')
+
+    assert sorted([p.name for p in tmp_path.iterdir()]) == [
+        'silorider.feed1.prof', 'silorider.feed2.prof']
+    for name in ['feed1', 'feed2']:
+        stats = pstats.Stats(str(tmp_path / ('silorider.%s.prof' % name)))
+        func_names = set([f[2] for f in stats.stats.keys()])
+        assert 'parse_url' in func_names
@@ -0,0 +1,76 @@
+import silorider.fetch
+from silorider.silos.base import MediaStore
+
+
+def test_media_store_downloads_once(monkeypatch):
+    downloads = []
+
+    def _download_file(url, path):
+        downloads.append(url)
+        return '/retrieved/' + url.lstrip('/')
+
+    monkeypatch.setattr(silorider.fetch, 'download_file', _download_file)
+
+    with MediaStore(max_workers=2) as store:
+        store.prefetch(['/img1.jpg', '/img2.jpg'])
+        assert sorted(downloads) == ['/img1.jpg', '/img2.jpg']
+
+        assert store.getFile('/img1.jpg') == '/retrieved/img1.jpg'
+        assert store.getFile('/img2.jpg') == '/retrieved/img2.jpg'
+        assert store.getFile('/img3.jpg') == '/retrieved/img3.jpg'
+        assert store.getFile('/img1.jpg') == '/retrieved/img1.jpg'
+        assert sorted(downloads) == ['/img1.jpg', '/img2.jpg', '/img3.jpg']
+
+
+def test_media_store_resizes_once(tmp_path, monkeypatch):
+    import os
+    import random
+    from PIL import Image
+
+    src_path = str(tmp_path / 'big.png')
+    rnd = random.Random(42)
+    im = Image.new('RGB', (200, 200))
+    im.putdata([(rnd.randrange(256), rnd.randrange(256), rnd.randrange(256))
+                for _ in range(200 * 200)])
+    im.save(src_path)
+    src_size = os.path.getsize(src_path)
+
+    def _download_file(url, path):
+        return src_path
+
+    monkeypatch.setattr(silorider.fetch, 'download_file', _download_file)
+
+    with MediaStore() as store:
+        assert store.getFile('/big.png', src_size * 2) == src_path
+
+        max_size = src_size // 3
+        path1 = store.getFile('/big.png', max_size)
+        assert path1 != src_path
+        assert os.path.getsize(path1) <= max_size
+        with Image.open(path1) as small_im:
+            assert small_im.size[0] < 200
+
+        mtime = os.path.getmtime(path1)
+        path2 = store.getFile('/big.png', max_size)
+        assert path2 == path1
+        assert os.path.getmtime(path2) == mtime
+
+
+def test_load_silos_only_imports_used_types():
+    # Run this in a separate interpreter since our own test session has
+    # already imported everything.
+    import sys
+    import subprocess
+    code = """
+import sys
+import configparser
+from silorider.cache.memory import MemoryCache
+from silorider.silos.base import load_silos
+config = configparser.ConfigParser(interpolation=None)
+config.read_string('[silo:test]\\ntype=mastodon\\nurl=/blah\\n')
+silos = load_silos(config, MemoryCache())
+assert silos[0].SILO_TYPE == 'mastodon'
+for mod in ('atproto', 'tweepy', 'ronkyuu', 'pyfacebook', 'PIL'):
+    assert mod not in sys.modules, mod
+"""
+    subprocess.run([sys.executable, '-c', code], check=True)
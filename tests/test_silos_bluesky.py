@@ -143,6 +143,64 @@ def test_one_micropost_with_links(cli, feedutil, bskymock):
     assert post[2] == [facet]
 
 
+def test_daemon_logs_in_once(cli, feedutil, bskymock):
+    feed = cli.createTempFeed(feedutil.makeFeed(
+        """<p class="p-name">This is a quick update.</p>
+<a class="u-url" href="/01234.html">permalink</a>"""
+    ))
+
+    cli.appendConfig('[daemon]\ninterval=0\njitter=0\n')
+    cli.appendSiloConfig('test', 'bluesky')
+    cli.setFeedConfig('feed', feed)
+    bskymock.installCredentials(cli, 'test')
+
+    ctx, _ = cli.run('daemon', '--max-polls', '3')
+    client = ctx.silos[0].client
+    assert client.login_count == 1
+    assert client.posts == [("This is a quick update.", None, None)]
+
+
+def test_session_is_saved(cli, feedutil, bskymock):
+    feed = cli.createTempFeed(feedutil.makeFeed(
+        """<p class="p-name">This is a quick update.</p>
+<a class="u-url" href="/01234.html">permalink</a>"""
+    ))
+
+    cli.appendSiloConfig('test', 'bluesky')
+    cli.setFeedConfig('feed', feed)
+    bskymock.installCredentials(cli, 'test')
+
+    ctx, _ = cli.run('process')
+    client = ctx.silos[0].client
+    assert client.password_logins == 1
+    assert ctx.cache.getCustomValue('test_session') == 'TEST_SESSION'
+
+
+@pytest.mark.parametrize('session, password_logins, session_logins', [
+    ('TEST_SESSION', 0, 1),
+    ('EXPIRED_SESSION', 1, 0),
+])
+def test_session_is_resumed(session, password_logins, session_logins,
+                            cli, feedutil, bskymock):
+    feed = cli.createTempFeed(feedutil.makeFeed(
+        """<p class="p-name">This is a quick update.</p>
+<a class="u-url" href="/01234.html">permalink</a>"""
+    ))
+
+    cli.appendSiloConfig('test', 'bluesky')
+    cli.setFeedConfig('feed', feed)
+    bskymock.installCredentials(cli, 'test')
+    cli.preExecHook(
+        lambda ctx: ctx.cache.setCustomValue('test_session', session))
+
+    ctx, _ = cli.run('process')
+    client = ctx.silos[0].client
+    assert client.password_logins == password_logins
+    assert client.session_logins == session_logins
+    assert client.posts == [("This is a quick update.", None, None)]
+    assert ctx.cache.getCustomValue('test_session') == 'TEST_SESSION'
+
+
 def _make_link_facet(url, start, end):
     return atprotomodels.AppBskyRichtextFacet.Main(
         features=[atprotomodels.AppBskyRichtextFacet.Link(uri=url)],
@@ -180,10 +238,23 @@ class BlueskyMock:
         # base_url is unused here.
         self.posts = []
         self.blobs = []
-
-    def login(self, email, password):
+        self.login_count = 0
+        self.password_logins = 0
+        self.session_logins = 0
+
+    def login(self, email=None, password=None, session_string=None):
+        self.login_count += 1
+        if session_string is not None:
+            if session_string != 'TEST_SESSION':
+                raise Exception("Invalid session")
+            self.session_logins += 1
+            return
         assert email == 'TEST_EMAIL'
         assert password == 'TEST_PASSWORD'
+        self.password_logins += 1
+
+    def export_session_string(self):
+        return 'TEST_SESSION'
 
     def upload_blob(self, tmpfile, desc):
         img = _make_atproto_image(tmpfile, test_index=len(self.blobs))
@@ -1,5 +1,4 @@
 import os.path
-import pytest
 from .mockutil import mock_urllib
 
 
@@ -130,49 +129,3 @@ def test_one_micropost_with_links(cli, feedutil, mastmock):
 
 def _patched_media_callback(self, tmpfile, mt, url, desc):
     return self.client.media_post(tmpfile, mt)
-
-
-@pytest.fixture(scope='session')
-def mastmock():
-    from silorider.silos.mastodon import MastodonSilo
-    MastodonSilo._CLIENT_CLASS = MastodonMock
-    return MastodonMockUtil()
-
-
-class MastodonMock:
-    @staticmethod
-    def create_app(app_name, scopes, api_base_url):
-        return ('TEST_CLIENT_ID', 'TEST_CLIENT_SECRET')
-
-    def __init__(self, client_id, client_secret, access_token, api_base_url):
-        self.toots = []
-        self.media = []
-        self.next_mid = 1
-
-    def log_in(self, username, password, scopes):
-        return 'TEST_ACCESS_TOKEN'
-
-    def auth_request_url(self, scopes):
-        return 'https://example.org/auth'
-
-    def status_post(self, toot, media_ids=None, visibility=None):
-        self.toots.append((toot, media_ids, visibility))
-
-    def media_post(self, filename, mimetype):
-        mid = self.next_mid
-        self.next_mid += 1
-        self.media.append((filename, mimetype, mid))
-        return mid
-
-
-class MastodonMockUtil:
-    def installTokens(self, cli, silo_name):
-        def do_install_tokens(ctx):
-            ctx.cache.setCustomValue(
-                '%s_clienttoken' % silo_name,
-                'TEST_CLIENT_ID,TEST_CLIENT_SECRET')
-            ctx.cache.setCustomValue(
-                '%s_accesstoken' % silo_name,
-                'TEST_ACCESS_TOKEN')
-
-        cli.preExecHook(do_install_tokens)
@@ -0,0 +1,78 @@
+import json
+import threading
+from silorider import timing
+
+
+def test_timings_disabled():
+    assert timing.get_recorder() is None
+    with timing.timed('fetch'):
+        pass
+    assert timing.get_recorder() is None
+
+
+def test_timings_per_feed_and_silo():
+    recorder = timing.enable()
+    try:
+        with timing.labels(feed='blog'):
+            with timing.timed('fetch'):
+                pass
+            with timing.labels(silo='social'):
+                with timing.timed('post'):
+                    pass
+                with timing.timed('post'):
+                    pass
+                # Timings on other threads keep the same labels if asked.
+                t = threading.Thread(
+                    target=timing.bind_labels(_time_upload))
+                t.start()
+                t.join()
+            with timing.timed('unknown'):
+                pass
+    finally:
+        assert timing.disable() is recorder
+
+    timings = [(t['feed'], t['silo'], t['stage'], t['count'])
+               for t in recorder.getTimings()]
+    assert timings == [
+        ('blog', None, 'fetch', 1),
+        ('blog', None, 'unknown', 1),
+        ('blog', 'social', 'upload', 1),
+        ('blog', 'social', 'post', 2)]
+
+    data = recorder.toDict()
+    assert [s['stage'] for s in data['stages']] == [
+        'fetch', 'upload', 'post', 'unknown']
+    assert data['wall_time'] > 0
+
+    table = recorder.formatTable()
+    assert 'social' in table
+
+
+def _time_upload():
+    with timing.timed('upload'):
+        pass
+
+
+def test_process_timings(cli, feedutil, mastmock, tmp_path):
+    feed = cli.createTempFeed(feedutil.makeFeed(
+        """<p class="p-name">This is a quick update.</p>
+<a class="u-url" href="/01234.html">permalink</a>"""))
+
+    cli.appendSiloConfig('test', 'mastodon', url='/blah')
+    cli.setFeedConfig('feed', feed)
+    mastmock.installTokens(cli, 'test')
+
+    timings_path = str(tmp_path / 'timings.json')
+    ctx, _ = cli.run('process', '--timings', '--timings-json', timings_path)
+    assert ctx.cache.wasPosted('test', '/01234.html')
+
+    with open(timings_path, 'r', encoding='utf8') as fp:
+        data = json.load(fp)
+    stages = set([(t['feed'], t['silo'], t['stage'])
+                  for t in data['timings']])
+    # Without class rules, mf2py parses the HTML itself, so there's no
+    # separate 'html_parse' stage if lxml is installed.
+    for stage in ['fetch', 'mf2_parse', 'entry_matching', 'interpret']:
+        assert ('feed', None, stage) in stages
+    for stage in ['cache_read', 'format', 'post', 'cache_write']:
+        assert ('feed', 'test', stage) in stages